@@ -5,20 +5,23 @@
 import os
 import re
 import json
+import hashlib
 import sys
 import time
 import re
-import asyncio
-import requests
-import deep_translator
+import argparse
 sys.stdout.reconfigure(encoding='utf-8')
 
-from haystack.document_stores import InMemoryDocumentStore
-from haystack.nodes import EmbeddingRetriever, PromptNode, PromptTemplate
-from haystack.pipelines import Pipeline
-
-from transformers import pipeline as hf_pipeline
-from deep_translator import GoogleTranslator
+# Heavy libraries (haystack, transformers, numpy, requests, deep_translator) are imported
+# lazily inside the functions that need them, so utility subcommands start instantly.
+from ingest_manifest import IngestManifest
+from term_matcher import get_matcher
+from bioasq_stream import iter_questions
+from translation_engine import TranslationCache, MarianBatchTranslator
+from chunking import split_chunks, chunk_documents, TokenCounter
+from parallel_loader import ParallelLoader, list_files
+from xml_extract import extract as extract_xml
+from profiling import profiled, stage, instrument_node # No-ops unless RAG_PROFILE is set
 
 
 # --------- CONFIGURATION ---------
@@ -27,6 +30,30 @@ EN_JSON_FILE = r"C:\Users\<fullpath>\en\BioASQ-training13b\training13b.json"
 EL_SRC_FOLDER_NEW = r"C:\Users\<fullpath>\qtlp_20131010_140423\e4118e7c-c941-4f5c-aca1-b69d81a315f3\xml"
 TRANSLATION_OUTPUT_FOLDER = r"C:\Users\<fullpath>\translation_english_to_greek"
 WIKI_OUTPUT_FOLDER = r"C:\Users\<fullpath>\assignment_corpus\wikipedia_el_cancer"
+WIKI_CACHE_FOLDER = r"C:\Users\<fullpath>\assignment_corpus\wikipedia_http_cache"
+TRANSLATION_CACHE_FILE = r"C:\Users\<fullpath>\translation_english_to_greek\translation_cache.sqlite"
+TRANSLATION_BACKEND = "collect" # "collect" = gather English texts for fetcher_translator.py, "marian" = local MarianMT
+XML_FIELDS = ("title",) # XML elements whose text is also stored in the document meta
+LOADER_IO_WORKERS = 16 # Concurrent file reads in load_biomedical_documents
+INGEST_MANIFEST_FILE = r"C:\Users\<fullpath>\assignment_corpus\ingest_manifest.json"
+EMBEDDING_INDEX_FOLDER = r"C:\Users\<fullpath>\assignment_corpus\embedding_index"
+DEDUP_THRESHOLD = 0.8 # Estimated Jaccard similarity above which documents are merged (see dedup.py); None disables
+CHUNK_MAX_TOKENS = 80 # Counted with the generator's tokenizer: 5 retrieved chunks (400) plus the template (~20) and the question stay within flan-t5-large's 512-token input
+CHUNK_OVERLAP_TOKENS = 16 # Tokens shared by neighbouring chunks of the same document
+SERVING_MODE = "gpu" # "gpu" = fp32 on GPU, "cpu" = fp32 on CPU, "cpu-int8" = int8 dynamic quantization on CPU (see quantization.py)
+VECTOR_INDEX = "exact" # "exact" = brute-force InMemoryDocumentStore, "ivf" = ANNDocumentStore (see ann_store.py; RETRIEVAL_MODE = "dense" only)
+VECTOR_STORE = "memory" # "memory" = InMemoryDocumentStore, "compact" = int8/float16 vectors and an mmap'd text blob (see compact_store.py; dense exact retrieval only)
+COMPACT_DTYPE = "int8" # Vector codes of the compact store: "int8" (scalar-quantized) or "float16"
+COMPACT_RESCORE = 100 # Candidates per query re-scored with the full-precision embedding index
+ANN_PARAMS = {"nlist": 1024, "nprobe": 16, "pq_m": 0, "rerank": 64, "min_docs": 5000} # nprobe/rerank trade recall for latency
+RETRIEVAL_MODE = "hybrid" # "dense" = EmbeddingRetriever only, "hybrid" = BM25 + dense with RRF, "prefilter" = dense scoring of BM25 candidates (see bm25.py; exact vector index only)
+LANGUAGE_ROUTING = True # Search Greek questions among Greek documents and English among English, in every RETRIEVAL_MODE (see lang_router.py; VECTOR_INDEX = "exact" and VECTOR_STORE = "memory" only)
+LANGUAGE_MIN_SCORE = 0.5 # Best same-language cosine similarity below which all languages are searched; always a cosine, although the store ranks by dot product
+EMBEDDING_WORKERS = max(1, (os.cpu_count() or 1) // 4) # CPU processes for corpus embedding, ~4 torch threads each (see embedding_stage.py)
+EMBEDDING_MEMORY_MB = 512 # Estimated activation memory per embedding batch; batches of short chunks grow, long ones shrink
+EMBEDDING_DTYPE = "float32" # Storage dtype of the persisted vectors; "float16" halves the index on disk and in memory
+EMBEDDING_MODEL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+GENERATOR_MODEL = "google/flan-t5-large"
 
 EN_TERMS = [
     "hematologic", "blood cancer", "hematological neoplasm", "leukemia",
@@ -59,23 +86,41 @@ GREEK_WIKI_TERMS = [
     "Λέμφωμα_Hodgkin", "Λέμφωμα_non-Hodgkin"
 ]
 
-def contains_terms(text, terms):
-    text_lower = text.lower()
-    for term in terms:
-        if term.lower() in text_lower:
-            return True
-    return False
+def contains_terms(text, terms): # Single-pass Aho–Corasick scan, the automaton is compiled once per term list
+    return get_matcher(terms).contains_any(text)
+
+@profiled("term_filter", count=len)
+def find_terms(text, terms): # Distinct terms found in the text, used for metadata tagging
+    return get_matcher(terms).matched_terms(text)
 
 # --- REAL TRANSLATION FUNCTION USING HELSINKI-NLP ---
-translator = hf_pipeline("translation", model="Helsinki-NLP/opus-mt-en-el")
+_translator = None
+_local_translator = None
+
+def get_translator(): # The Helsinki-NLP pipeline is loaded on first use, not at import time
+    global _translator
+    if _translator is None:
+        from transformers import pipeline as hf_pipeline
+        _translator = hf_pipeline("translation", model="Helsinki-NLP/opus-mt-en-el", device=-1) # CPU is enough for batched MarianMT
+    return _translator
+
+def get_local_translator(): # Batched MarianMT translation backed by the persistent sentence cache
+    global _local_translator
+    if _local_translator is None:
+        os.makedirs(TRANSLATION_OUTPUT_FOLDER, exist_ok=True)
+        cache = TranslationCache(TRANSLATION_CACHE_FILE, namespace="Helsinki-NLP/opus-mt-en-el")
+        _local_translator = MarianBatchTranslator(get_translator(), cache=cache, batch_size=16)
+    return _local_translator
 
 
 # THE TRANSLATION TAKES 2 HOURS TO COMPILE, SO FOR FAST COMPILATION, WE CAN USE A MOCK FUNCTION
-# Uncomment the following function to use a mock translation for testing purposes.
+# Set TRANSLATION_BACKEND = "marian" to translate locally instead of collecting the texts.
 # Collect all English texts that would be translated
 collected_english_texts = []
 
 def translate_to_greek(text):
+    if TRANSLATION_BACKEND == "marian": # Local batched translation, cached sentences are free
+        return get_local_translator().translate(text)
     # Instead of translating, collect the English text
     collected_english_texts.append(text)
     return "[Greek translation of]: " + text
@@ -122,36 +167,17 @@ r'''
         print("[Translation error] Failed after retries. Returning original chunk.")
         return chunk
 
-    # First split by sentence, then ensure all chunks are <= max_chars
-    sentences = re.split(r'(?<=[.!?])\s+', text)
-    chunks = []
-    current = ""
-    for sentence in sentences:
-        if len(current) + len(sentence) + 1 <= max_chars:
-            current += " " + sentence if current else sentence
-        else:
-            # If current is too big, split it by characters
-            if len(current) > max_chars:
-                for i in range(0, len(current), max_chars):
-                    chunks.append(current[i:i+max_chars].strip())
-            elif current.strip():
-                chunks.append(current.strip())
-            current = sentence
-    # Add the last chunk
-    if len(current) > max_chars:
-        for i in range(0, len(current), max_chars):
-            chunks.append(current[i:i+max_chars].strip())
-    elif current.strip():
-        chunks.append(current.strip())
+    # Sentence-aware chunks of at most max_chars (shared with fetcher_translator.py)
+    chunks = split_chunks(text, max_chars)
 
     # Translate each chunk and join
-    greek_text = ""
+    translated_chunks = []
     for chunk in chunks:
         translated = safe_translate(chunk)
         if translated:
-            greek_text += translated + "\n"
+            translated_chunks.append(translated)
         time.sleep(delay)  # Slow down to avoid rate-limiting
-    return greek_text.strip()
+    return "\n".join(translated_chunks).strip()
 '''
 
 # EXPIREMENTAL TRANSLATION FUNCTION - WIKIPEDIA VERSION
@@ -162,6 +188,8 @@ def translate_to_greek(text, max_chars=5000, retries=3, delay=3):
     Translates English text to Greek using GoogleTranslator, chunking if needed.
     Handles connection errors and skips empty/oversized chunks.
     """
+    from deep_translator import GoogleTranslator
+
     def safe_translate(chunk):
         chunk = chunk.strip()
         if not chunk:
@@ -184,26 +212,11 @@ def translate_to_greek(text, max_chars=5000, retries=3, delay=3):
         print("[Translation error] Failed after retries. Returning original chunk.")
         return chunk
 
-    # Split text into sentences and then into chunks
-    sentences = re.split(r'(?<=[.!?])\s+', text)
-    chunks = []
-    current = ""
-    for sentence in sentences:
-        if len(current) + len(sentence) + 1 <= max_chars:
-            current += " " + sentence if current else sentence
-        else:
-            if current.strip():
-                chunks.append(current.strip())
-            current = sentence
-    if current.strip():
-        chunks.append(current.strip())
+    # Split text into sentence-aware chunks (shared with fetcher_translator.py)
+    chunks = split_chunks(text, max_chars)
     # Translate each chunk and join
-    greek_text = ""
-    for chunk in chunks:
-        translated = safe_translate(chunk)
-        if translated:
-            greek_text += translated + "\n"
-    return greek_text.strip()
+    translated_chunks = [t for t in (safe_translate(chunk) for chunk in chunks) if t]
+    return "\n".join(translated_chunks).strip()
 '''
 
 
@@ -225,25 +238,47 @@ def filter_and_translate_txt(): # Filter and translate TXT files
 
 # Filter and translate JSON files
 # This function reads a JSON file, filters questions based on specific terms, translates them to Greek
-def filter_and_translate_json(): # Filter and translate JSON files
-    if not os.path.exists(EN_JSON_FILE): # Check if the JSON file exists
-        print("JSON file not found.") # If not found, print a message and return
-        return # Stop processing if JSON file is not found
-    with open(EN_JSON_FILE, "r", encoding="utf-8") as f: # Open the JSON file for reading
-        data = json.load(f) # Load the JSON data
-    for idx, item in enumerate(data.get("questions", [])): # Iterate through each question in the JSON data
+_bioasq_matches = {} # (path, size, mtime) -> filtered (index, text) pairs, shared by both BioASQ consumers
+
+def iter_bioasq_matches(path=EN_JSON_FILE): # Stream the BioASQ questions that contain any of the English terms
+    """
+    Yields ``(idx, text, terms)`` for every BioASQ question that mentions an English term.
+
+    The file is parsed incrementally, one question at a time. The filtered matches are
+    remembered, so ``filter_and_translate_json`` and ``load_biomedical_documents``
+    share a single parse pass per run.
+    """
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    if key in _bioasq_matches: # Already parsed in this run
+        yield from _bioasq_matches[key]
+        return
+    matches = []
+    for idx, item in enumerate(iter_questions(path)): # Iterate through each question without loading the whole file
         text_fields = [] # Initialize a list to hold text fields
         if "body" in item: # If the question has a body field
             text_fields.append(item["body"]) # Add the body text to the list
         if "ideal_answer" in item and isinstance(item["ideal_answer"], list): # If the question has an ideal answer field and it's a list
             text_fields.extend(item["ideal_answer"]) # Add all ideal answers to the list
         text = "\n".join(text_fields) # Join all text fields into a single string
-        if contains_terms(text, EN_TERMS): # Check if the text contains any of the English terms
-            greek_text = translate_to_greek(text) # Translate the text to Greek
-            out_path = os.path.join(TRANSLATION_OUTPUT_FOLDER, f"bioasq_q{idx+1}_el.txt") # Prepare output path for the translated file
-            with open(out_path, "w", encoding="utf-8") as out_f: # Open the output file for writing
-                out_f.write(greek_text) # Write the translated text to the output file
-            print(f"Saved translated JSON: {out_path}") # Print confirmation of saved file
+        found = find_terms(text, EN_TERMS) # Check if the text contains any of the English terms
+        if found:
+            matches.append((idx, text, found))
+            yield idx, text, found
+    _bioasq_matches[key] = matches # Only cached once the pass completed
+
+# Filter and translate JSON files
+# This function reads a JSON file, filters questions based on specific terms, translates them to Greek
+def filter_and_translate_json(): # Filter and translate JSON files
+    if not os.path.exists(EN_JSON_FILE): # Check if the JSON file exists
+        print("JSON file not found.") # If not found, print a message and return
+        return # Stop processing if JSON file is not found
+    for idx, text, _ in iter_bioasq_matches(EN_JSON_FILE): # Stream the questions that contain any of the English terms
+        greek_text = translate_to_greek(text) # Translate the text to Greek
+        out_path = os.path.join(TRANSLATION_OUTPUT_FOLDER, f"bioasq_q{idx+1}_el.txt") # Prepare output path for the translated file
+        with open(out_path, "w", encoding="utf-8") as out_f: # Open the output file for writing
+            out_f.write(greek_text) # Write the translated text to the output file
+        print(f"Saved translated JSON: {out_path}") # Print confirmation of saved file
 
 def filter_and_translate_xml(): # Filter and translate XML files
     if not os.path.exists(EL_SRC_FOLDER_NEW): # Check if the XML source folder exists
@@ -252,8 +287,7 @@ def filter_and_translate_xml(): # Filter and translate XML files
     for filename in os.listdir(EL_SRC_FOLDER_NEW): # List all files in the XML source folder
         if filename.endswith(".xml"): # Process only XML files
             file_path = os.path.join(EL_SRC_FOLDER_NEW, filename) # Prepare the full path to the XML file
-            with open(file_path, "r", encoding="utf-8") as f: # Open the XML file for reading
-                text = f.read() # Read the content of the XML file
+            text, _ = extract_xml(file_path) # Text nodes only, streamed; tags and attributes are not translated
             if contains_terms(text, EN_TERMS): # Check if the text contains any of the English terms
                 greek_text = translate_to_greek(text) # Translate the text to Greek
                 out_path = os.path.join(TRANSLATION_OUTPUT_FOLDER, filename.replace(".xml", "_el.txt")) # Prepare output path for the translated file
@@ -262,6 +296,7 @@ def filter_and_translate_xml(): # Filter and translate XML files
                 print(f"Saved translated XML: {out_path}") # Print confirmation of saved file
 
 def fetch_wikipedia_intro(term): # Fetch Wikipedia introduction for a given term
+    import requests # Only needed when fetching
     url = "https://el.wikipedia.org/w/api.php" # Wikipedia API URL
     params = {  
         "action": "query", 
@@ -281,77 +316,199 @@ def fetch_wikipedia_intro(term): # Fetch Wikipedia introduction for a given term
     return None # If no extract is found, return None
 
 def fetch_and_save_wikipedia(): # Fetch and save Wikipedia articles for Greek cancer terms
-    os.makedirs(WIKI_OUTPUT_FOLDER, exist_ok=True) # Ensure the output folder exists
-    for term in GREEK_WIKI_TERMS: # Iterate through each term in the Greek Wikipedia terms list
-        print(f"Fetching Wikipedia for: {term}") # Print the term being fetched
-        intro = fetch_wikipedia_intro(term) # Fetch the Wikipedia introduction for the term
-        if intro: # If an introduction is found
-            filename = os.path.join(WIKI_OUTPUT_FOLDER, f"{term}.txt") # Prepare the filename for saving
-            with open(filename, "w", encoding="utf-8") as f: # Open the file for writing
-                f.write(intro) # Write the introduction to the file
-            print(f"Saved Wikipedia: {filename}") # Print confirmation of saved file
-        else: # If no introduction is found
-            print(f"No Wikipedia entry found for: {term}") # Print a message indicating no entry was found
-
-def load_biomedical_documents(): # Load biomedical documents from various sources
-    docs = [] # Initialize an empty list to hold documents
-    # English MayoClinic .txt files
-    for filename in os.listdir(EN_SRC_FOLDER): # List all files in the English source folder
-        if filename.endswith(".txt"): # Process only TXT files
-            with open(os.path.join(EN_SRC_FOLDER, filename), "r", encoding="utf-8") as f: # Open the file for reading
-                text = f.read() # Read the content of the file
-            if contains_terms(text, EN_TERMS): # Check if the text contains any of the English terms
-                docs.append({"content": text, "meta": {"filename": filename, "lang": "en"}}) # Append the document to the list with metadata
-    # English BioASQ JSON
-    if os.path.exists(EN_JSON_FILE): # Check if the BioASQ JSON file exists
-        with open(EN_JSON_FILE, "r", encoding="utf-8") as f: # Open the JSON file for reading
-            data = json.load(f) # Load the JSON data
-        for idx, item in enumerate(data.get("questions", [])): # Iterate through each question in the JSON data
-            text_fields = [] # Initialize a list to hold text fields
-            if "body" in item: # If the question has a body field
-                text_fields.append(item["body"]) # Add the body text to the list 
-            if "ideal_answer" in item and isinstance(item["ideal_answer"], list): # If the question has an ideal answer field and it's a list
-                text_fields.extend(item["ideal_answer"]) # If the question has an ideal answer field and it's a list, add all ideal answers to the list
-            text = "\n".join(text_fields) # Join all text fields into a single string
-            if contains_terms(text, EN_TERMS): # Check if the text contains any of the English terms
-                docs.append({"content": text, "meta": {"filename": f"bioasq_q{idx+1}.txt", "lang": "en"}}) # Append the document to the list with metadata
-    # Greek XML files
-    for filename in os.listdir(EL_SRC_FOLDER_NEW): # List all files in the Greek XML source folder
-        if filename.endswith(".xml"): # Process only XML files
-            with open(os.path.join(EL_SRC_FOLDER_NEW, filename), "r", encoding="utf-8") as f: # Open the file for reading
-                text = f.read() # Read the content of the file
-            if contains_terms(text, GREEK_TERMS): # Check if the text contains any of the Greek terms
-                docs.append({"content": text, "meta": {"filename": filename, "lang": "el"}}) # Append the document to the list with metadata
-    # Wikipedia Greek files
-    if os.path.exists(WIKI_OUTPUT_FOLDER): # Check if the Wikipedia output folder exists
-        for filename in os.listdir(WIKI_OUTPUT_FOLDER): # List all files in the Wikipedia output folder
-            if filename.endswith(".txt"): # Process only TXT files
-                with open(os.path.join(WIKI_OUTPUT_FOLDER, filename), "r", encoding="utf-8") as f: # Open the file for reading
-                    text = f.read() # Read the content of the file
-                docs.append({"content": text, "meta": {"filename": filename, "lang": "el"}}) # Append the document to the list with metadata
+    from wiki_fetcher import WikiBulkFetcher # Batched titles, pooled session, on-disk HTTP cache
+    print(f"Fetching Wikipedia for {len(GREEK_WIKI_TERMS)} terms...") # Print the number of terms being fetched
+    fetcher = WikiBulkFetcher(WIKI_CACHE_FOLDER) # Responses younger than a week are served from the cache
+    try:
+        saved, missing = fetcher.fetch_and_save(GREEK_WIKI_TERMS, WIKI_OUTPUT_FOLDER) # Fetch in batches and write the files concurrently
+    finally:
+        fetcher.close()
+    for filename in saved: # Print confirmation of saved files
+        print(f"Saved Wikipedia: {filename}")
+    for term in missing: # Print a message for every term without an entry
+        print(f"No Wikipedia entry found for: {term}")
+    print(f"[Wikipedia] {fetcher.stats}")
+
+def _parse_txt(filename, terms, lang, match=None): # Build the parser for a single TXT/XML file
+    match = match or find_terms # Term filtering runs in-thread unless a process-pool matcher is given
+    def parse(text):
+        if terms is None: # Wikipedia files are not filtered
+            return [{"content": text, "meta": {"filename": filename, "lang": lang}}]
+        found = match(text, terms) # One scan both filters and tags the document
+        if found:
+            return [{"content": text, "meta": {"filename": filename, "lang": lang, "terms": found}}]
+        return []
+    return parse
+
+def _parse_xml(filename, terms, lang, match=None): # Build the streaming parser for a single XML file
+    match = match or find_terms
+    def parse(path):
+        text, fields = extract_xml(path, fields=XML_FIELDS) # Markup-free text; elements are freed as the file is read
+        found = match(text, terms) if text else []
+        if found:
+            return [{"content": text, "meta": dict(fields, filename=filename, lang=lang, terms=found)}]
+        return []
+    return parse
+
+def _parse_bioasq(path): # Turn the streamed BioASQ matches into question documents
+    return [{"content": text, "meta": {"filename": f"bioasq_q{idx+1}.txt", "lang": "en", "terms": found}}
+            for idx, text, found in iter_bioasq_matches(path)]
+
+@profiled("load_documents", count=len)
+def load_biomedical_documents(manifest_path=INGEST_MANIFEST_FILE): # Load biomedical documents from various sources
+    """
+    Loads the filtered documents of all corpus sources.
+
+    Files recorded in the ingestion manifest with an unchanged size and mtime are not
+    opened; their documents come from the manifest. Files deleted since the last run
+    are dropped. Pass ``manifest_path=None`` to force a full rescan.
+    """
+    terms_version = hashlib.sha1(json.dumps([EN_TERMS, GREEK_TERMS, XML_FIELDS, "xml-text"]).encode("utf-8")).hexdigest() # Editing the term lists or the XML extraction invalidates the manifest
+    manifest = IngestManifest(manifest_path, version=terms_version) if manifest_path else None # Incremental ingestion state
+    def load(path, parse, stream=False): # Read through the manifest when enabled
+        if manifest is not None:
+            return manifest.load(path, parse, stream=stream)
+        if stream: # The parser reads the file itself
+            return parse(path)
+        with open(path, "r", encoding="utf-8") as f: # Open the file for reading
+            return parse(f.read()) # Read the content of the file
+    with ParallelLoader(io_workers=LOADER_IO_WORKERS) as loader: # Overlap the I/O waits of all sources
+        # List the three folders concurrently; the result order is fixed, so the document order is too
+        en_files, el_files, wiki_files = loader.map(lambda args: list_files(*args), [
+            (EN_SRC_FOLDER, ".txt"), (EL_SRC_FOLDER_NEW, ".xml"), (WIKI_OUTPUT_FOLDER, ".txt")])
+        en_match = loader.find_terms if loader.use_processes(len(en_files)) else None # Large folders filter in worker processes
+        el_match = loader.find_terms if loader.use_processes(len(el_files)) else None
+        tasks = [] # (path, parser, stream) in the final document order
+        # English MayoClinic .txt files, kept if they contain any of the English terms
+        tasks += [(os.path.join(EN_SRC_FOLDER, f), _parse_txt(f, EN_TERMS, "en", en_match), False) for f in en_files]
+        # English BioASQ JSON, streamed; one manifest entry covers every question in the file
+        if os.path.exists(EN_JSON_FILE):
+            tasks.append((EN_JSON_FILE, _parse_bioasq, True))
+        # Greek XML files, streamed through the text extractor, kept if they contain any of the Greek terms
+        tasks += [(os.path.join(EL_SRC_FOLDER_NEW, f), _parse_xml(f, GREEK_TERMS, "el", el_match), True) for f in el_files]
+        # Wikipedia Greek files, kept unfiltered
+        tasks += [(os.path.join(WIKI_OUTPUT_FOLDER, f), _parse_txt(f, None, "el"), False) for f in wiki_files]
+        results = loader.map(lambda task: load(*task), tasks) # Per-file reads run concurrently, results come back in task order
+    docs = [doc for file_docs in results for doc in file_docs] # Flatten in task order, so the document list is deterministic
+    if manifest is not None:
+        removed = manifest.prune() # Files deleted since the last run no longer contribute documents
+        manifest.save()
+        print(f"[Ingestion] {manifest.stats}, {len(removed)} removed.")
     return docs  # Return the list of documents loaded from various sources
 
-def build_haystack_pipeline(): # Build the Haystack RAG pipeline
-    document_store = InMemoryDocumentStore(embedding_dim=384) # Initialize an in-memory document store with specified embedding dimension
-    docs = load_biomedical_documents() # Load biomedical documents from various sources
-    document_store.write_documents(docs) # Write the loaded documents to the document store
+def build_haystack_pipeline(docs=None, chunk_max_tokens=CHUNK_MAX_TOKENS, serving_mode=SERVING_MODE, vector_index=VECTOR_INDEX,
+                            retrieval_mode=RETRIEVAL_MODE, embedding_model=EMBEDDING_MODEL, generator_model=GENERATOR_MODEL,
+                            index_folder=EMBEDDING_INDEX_FOLDER, dedup_threshold=DEDUP_THRESHOLD, vector_store=VECTOR_STORE,
+                            language_routing=LANGUAGE_ROUTING, ann_params=None): # Build the Haystack RAG pipeline; the defaults come from the configuration above (rag_benchmark.py overrides them)
+    import numpy as np
+    from haystack.document_stores import InMemoryDocumentStore
+    from haystack.nodes import EmbeddingRetriever, PromptNode, PromptTemplate
+    from haystack.pipelines import Pipeline
+    from haystack.schema import Document
+    from embedding_index import EmbeddingIndex
+    from batch_query import PROMPT_TEXT
+    from dedup import deduplicate
+    from embedding_stage import EmbeddingStage
+    if vector_store == "compact" and (vector_index != "exact" or retrieval_mode != "dense"):
+        raise ValueError('VECTOR_STORE = "compact" supports VECTOR_INDEX = "exact" with RETRIEVAL_MODE = "dense" only')
+    if vector_index == "ivf" and retrieval_mode != "dense": # HybridRetriever scores densely against the exact matrix
+        raise ValueError('VECTOR_INDEX = "ivf" supports RETRIEVAL_MODE = "dense" only; hybrid and prefilter search exactly')
+    if language_routing and (vector_index != "exact" or vector_store != "memory"): # The IVF index and the compact store are not partitioned by language
+        raise ValueError('LANGUAGE_ROUTING requires VECTOR_INDEX = "exact" and VECTOR_STORE = "memory"; set LANGUAGE_ROUTING = False')
+    use_gpu = serving_mode == "gpu"
+    if serving_mode == "cpu-int8":
+        from quantization import quantize_retriever, quantize_prompt_node
+    if vector_index == "ivf": # Approximate search for large corpora; exact search below ANN_PARAMS["min_docs"]
+        from ann_store import ANNDocumentStore
+        document_store = ANNDocumentStore(embedding_dim=384, **(ann_params or ANN_PARAMS))
+    else:
+        document_store = InMemoryDocumentStore(embedding_dim=384) # Initialize an in-memory document store with specified embedding dimension
+    if docs is None:
+        docs = load_biomedical_documents() # Load biomedical documents from various sources
+    if dedup_threshold: # BioASQ, MayoClinic and Wikipedia overlap; embed each near-duplicate cluster once
+        with stage("dedup", items=len(docs)):
+            total = len(docs)
+            docs = deduplicate(docs, threshold=dedup_threshold, cache_path=os.path.join(index_folder, "dedup_clusters.json")) # Provenance goes to meta["merged_sources"]; clusters reused while the corpus is unchanged
+        print(f"[Dedup] {total} documents -> {len(docs)} after merging near-duplicates.")
+    with stage("chunking", items=len(docs)):
+        docs = chunk_documents(docs, max_tokens=chunk_max_tokens, overlap_tokens=min(CHUNK_OVERLAP_TOKENS, chunk_max_tokens // 4),
+                               count_tokens=TokenCounter(generator_model), # Generator subword tokens, the unit of its input limit
+                               cache_path=os.path.join(index_folder, "chunk_spans.json")) # Sentence-aligned windows that fit the prompt at top_k=5; an unchanged corpus is not re-tokenized
+        docs = [Document.from_dict(d) for d in docs]
     retriever = EmbeddingRetriever( # Initialize the EmbeddingRetriever for the Haystack pipeline
         document_store=document_store, # Use the document store to retrieve documents
-        embedding_model="sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2", # Use a multilingual model for embeddings
-        use_gpu=True # Use GPU for the retriever
+        embedding_model=embedding_model, # Use a multilingual model for embeddings
+        use_gpu=use_gpu # Use GPU for the retriever unless serving on CPU
     )
-    document_store.update_embeddings(retriever) # Update embeddings for the retriever
+    if serving_mode == "cpu-int8": # int8 dynamic quantization of the MiniLM embedder
+        quantize_retriever(retriever)
+    index_model = f"{embedding_model}:int8" if serving_mode == "cpu-int8" else embedding_model # Queries are embedded at the same precision as the stored vectors
+    index = EmbeddingIndex(index_folder, embedding_dim=384, model_name=index_model, dtype=EMBEDDING_DTYPE) # Persisted vectors from previous runs
+    st_model = getattr(retriever.embedding_encoder, "embedding_model", None) # The sentence-transformers model behind the retriever
+    embedder = retriever.embed_documents
+    if st_model is not None: # Length-sorted, memory-budgeted batches; sharded over processes on CPU
+        embedder = EmbeddingStage(embedding_model, embedding_dim=384, model=st_model, workers=1 if use_gpu else EMBEDDING_WORKERS,
+                                  memory_budget_mb=EMBEDDING_MEMORY_MB, quantize=serving_mode == "cpu-int8")
+    with stage("embedding", items=len(docs)): # Covers cache lookups plus the re-embedded documents
+        embeddings = index.sync(docs, embedder) # Only documents whose content hash changed are re-embedded
+    if vector_store == "compact": # Served from quantized vectors and an mmap'd blob; no Document objects are kept
+        from compact_store import CompactVectorStore, CompactRetriever
+        compact_folder = os.path.join(index_folder, "compact_store")
+        with stage("compact_store", items=len(docs)):
+            if not CompactVectorStore.is_current(compact_folder, index.version, COMPACT_DTYPE): # Rebuilt when the corpus changes
+                CompactVectorStore.build(compact_folder, docs, embeddings, dtype=COMPACT_DTYPE,
+                                         similarity=document_store.similarity, version=index.version)
+    else:
+        for doc, embedding in zip(docs, embeddings): # Attach the cached or freshly computed vectors
+            doc.embedding = np.array(embedding, dtype=np.float32)
+        with stage("write_documents", items=len(docs)):
+            document_store.write_documents(docs) # Write the embedded documents to the document store
     prompt_node = PromptNode( # Initialize the PromptNode for the Haystack pipeline
-        model_name_or_path="google/flan-t5-large", # Use the FLAN-T5 model for the prompt node
-        default_prompt_template=PromptTemplate("Given the context, answer the question.\nContext: {join(documents)}\nQuestion: {query}\nAnswer:"), # Define the prompt template for the prompt node
-        use_gpu=True # Use GPU for the prompt node
+        model_name_or_path=generator_model, # Use the FLAN-T5 model for the prompt node
+        default_prompt_template=PromptTemplate(PROMPT_TEXT), # Define the prompt template for the prompt node (shared with batch_query.run_batch)
+        use_gpu=use_gpu # Use GPU for the prompt node unless serving on CPU
     )
+    if serving_mode == "cpu-int8": # int8 dynamic quantization of flan-t5-large
+        quantize_prompt_node(prompt_node)
+    hybrid_mode = {"hybrid": "rrf", "prefilter": "prefilter"}.get(retrieval_mode) # BM25 catches exact acronyms (CLL, DLBCL, CAR-T) that dense retrieval misses
+    if language_routing: # One matrix (and BM25 index) per language; cross-lingual only on weak matches
+        from lang_router import LanguageRouter
+        retriever = LanguageRouter(retriever, min_score=LANGUAGE_MIN_SCORE, mode=hybrid_mode or "dense")
+    elif hybrid_mode:
+        from bm25 import HybridRetriever
+        retriever = HybridRetriever(retriever, mode=hybrid_mode)
+    if vector_store == "compact": # Candidates are re-scored against the float32/float16 embedding index memmap
+        retriever = CompactRetriever(retriever, CompactVectorStore(compact_folder, full_vectors=index.vectors, rescore=COMPACT_RESCORE))
+    instrument_node(retriever, "retrieval") # Times pipe.run; batch_query.run_batch records the same stages itself
+    instrument_node(prompt_node, "generation")
     pipe = Pipeline() # Initialize the Haystack pipeline
     pipe.add_node(component=retriever, name="Retriever", inputs=["Query"]) # Add the retriever node to the pipeline
     pipe.add_node(component=prompt_node, name="PromptNode", inputs=["Retriever"]) # Add the prompt node to the pipeline
+    pipe.corpus_version = index.version # Changes whenever the indexed corpus changes; used to invalidate query caches
     return pipe 
 
-if __name__ == "__main__":
+def process_greek_translations():
+    """
+    Reads successful_fetched_translation.txt and saves each Greek translation
+    as a separate file for manual or automated review.
+    """
+    INPUT_FILE = os.path.join(TRANSLATION_OUTPUT_FOLDER, "successful_fetched_translation.txt")
+    OUTPUT_FOLDER = os.path.join(TRANSLATION_OUTPUT_FOLDER, "final_greek_texts")
+    os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+    if not os.path.exists(INPUT_FILE):
+        print(f"File not found: {INPUT_FILE}")
+        return
+    with open(INPUT_FILE, "r", encoding="utf-8") as f:
+        content = f.read()
+    greek_blocks = [block.strip() for block in content.split("\n\n") if block.strip()]
+    for idx, block in enumerate(greek_blocks, 1):
+        out_path = os.path.join(OUTPUT_FOLDER, f"greek_translation_{idx}.txt")
+        with open(out_path, "w", encoding="utf-8") as out_f:
+            out_f.write(block)
+        print(f"Saved Greek translation: {out_path}")
+    print("All Greek translations have been saved for review.")
+
+def run_collect(): # Filter the corpora and save the English texts to translate
     print("Filtering and collecting English documents...")  # Start of the filtering and collecting process
     os.makedirs(TRANSLATION_OUTPUT_FOLDER, exist_ok=True)  # Ensure output folder exists
     filter_and_translate_txt()  # Filter and collect TXT files
@@ -365,10 +522,13 @@ if __name__ == "__main__":
         f.write("\n\n".join(collected_english_texts))
     print(f"Saved all English texts to: {output_path}")
 
+def run_wiki(): # Fetch the Greek Wikipedia intros
     print("Fetching Wikipedia articles for bonus...")  # Start of the Wikipedia fetching process
     fetch_and_save_wikipedia()  # Fetch and save Wikipedia articles related to cancer in Greek
     print("Wikipedia collection complete!\n")  # End of the Wikipedia collection
 
+def run_rag(): # Build the pipeline and answer the test questions
+    from batch_query import run_batch
     print("Building Haystack RAG pipeline and indexing biomedical documents...")  # Start of the pipeline setup
     pipe = build_haystack_pipeline()  # Build the Haystack RAG pipeline
     print("Ready!\n")  # End of the pipeline setup
@@ -387,47 +547,30 @@ if __name__ == "__main__":
     ]
 
     print("=== HAYSTACK RAG SYSTEM TEST ===\n")  # Start of the RAG system test
-    for idx, q in enumerate(test_questions, 1):
-        print(f"Q{idx}: {q}")
-        prediction = pipe.run(
-            query=q,
-            params={"Retriever": {"top_k": 5}}
-        )
-        print("Raw prediction:", prediction)
-        answers = prediction.get("answers", [])
-        if answers and hasattr(answers[0], "answer"):
-            print("Answer:", answers[0].answer)
-        elif "results" in prediction and prediction["results"]:
-            print("Answer:", prediction["results"][0])
-        else:
-            print("No answer found.")
+    results = run_batch(pipe, test_questions, top_k=5, batch_size=8)  # All questions embedded, retrieved and generated in batches
+    for idx, result in enumerate(results, 1):
+        print(f"Q{idx}: {result['query']}")
+        print("Retrieved:", [doc.meta.get("filename") for doc in result["documents"]])
+        print("Answer:", result["answer"] or "No answer found.")
         print("-----")
     print("\nRAG system test completed.")
 
+def run_split_translations(): # Split the fetched translations into one file per block
+    print("\nProcessing Greek translations from successful_fetched_translation.txt...")
+    process_greek_translations()
 
-def process_greek_translations():
-    """
-    Reads successful_fetched_translation.txt and saves each Greek translation
-    as a separate file for manual or automated review.
-    """
-    INPUT_FILE = os.path.join(TRANSLATION_OUTPUT_FOLDER, "successful_fetched_translation.txt")
-    OUTPUT_FOLDER = os.path.join(TRANSLATION_OUTPUT_FOLDER, "final_greek_texts")
-    os.makedirs(OUTPUT_FOLDER, exist_ok=True)
-    if not os.path.exists(INPUT_FILE):
-        print(f"File not found: {INPUT_FILE}")
-        return
-    with open(INPUT_FILE, "r", encoding="utf-8") as f:
-        content = f.read()
-    greek_blocks = [block.strip() for block in content.split("\n\n") if block.strip()]
-    for idx, block in enumerate(greek_blocks, 1):
-        out_path = os.path.join(OUTPUT_FOLDER, f"greek_translation_{idx}.txt")
-        with open(out_path, "w", encoding="utf-8") as out_f:
-            out_f.write(block)
-        print(f"Saved Greek translation: {out_path}")
-    print("All Greek translations have been saved for review.")
+COMMANDS = {
+    "collect": run_collect,
+    "wiki": run_wiki,
+    "rag": run_rag,
+    "split-translations": run_split_translations,
+}
 
-# Add this call at the end of your main block:
 if __name__ == "__main__":
-    # ...existing main code...
-    print("\nProcessing Greek translations from successful_fetched_translation.txt...")
-    process_greek_translations()
+    parser = argparse.ArgumentParser(description="Biomedical RAG system.")
+    parser.add_argument("command", nargs="?", choices=["all"] + list(COMMANDS), default="all",
+                        help="step to run (default: all steps in order)")
+    args = parser.parse_args()
+    for name, command in COMMANDS.items():
+        if args.command in ("all", name):
+            command()
@@ -0,0 +1,297 @@
+# By Alexandros Panagiotakopoulos
+# Copyright (c) 2025 Alexandros Panagiotakopoulos. All rights reserved.
+# Date: 20/06/2025
+
+"""
+Approximate nearest-neighbour search for the EmbeddingRetriever.
+
+``IVFIndex`` is an inverted-file index: k-means splits the vectors into ``nlist``
+cells and a query is only scored against the ``nprobe`` cells whose centroids are
+closest to it. With ``pq_m > 0`` the vectors inside the cells are additionally
+product-quantized (``pq_m`` one-byte codes per vector) and scored through per-query
+lookup tables, and the best ``rerank`` candidates are re-scored exactly.
+``nprobe`` and ``rerank`` trade recall for latency at query time.
+
+``ANNDocumentStore`` is an ``InMemoryDocumentStore`` whose ``query_by_embedding``
+goes through the index, so it plugs into ``build_haystack_pipeline()`` unchanged;
+``ann_search`` answers a whole batch of queries (used by ``batch_query.run_batch``).
+Run this file directly for a recall/latency benchmark against exact search.
+"""
+
+import copy
+import time
+
+import numpy as np
+
+from haystack.document_stores import InMemoryDocumentStore
+
+
+def _kmeans(x, k, iters=15, seed=0, max_train=50000):
+    """Plain Lloyd's k-means on (a sample of) ``x``; returns (k, dim) centroids."""
+    rng = np.random.default_rng(seed)
+    if len(x) > max_train: # Training on a sample is enough for cell boundaries
+        x = x[rng.choice(len(x), max_train, replace=False)]
+    k = min(k, len(x))
+    centroids = x[rng.choice(len(x), k, replace=False)].copy()
+    for _ in range(iters):
+        assign = _nearest(x, centroids)
+        counts = np.bincount(assign, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, x)
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        if empty.any(): # Re-seed empty cells with random points
+            centroids[empty] = x[rng.choice(len(x), int(empty.sum()), replace=False)]
+    return centroids
+
+
+def _nearest(x, centroids, block=65536):
+    """Index of the closest centroid (L2) for every row of ``x``, computed in blocks."""
+    c_norms = (centroids ** 2).sum(axis=1)
+    out = np.empty(len(x), dtype=np.int64)
+    for i in range(0, len(x), block):
+        xb = x[i:i + block]
+        out[i:i + block] = np.argmin(c_norms[None, :] - 2 * xb @ centroids.T, axis=1) # ||x||^2 is constant per row
+    return out
+
+
+def _top_k(scores, k):
+    """Indexes of the ``k`` highest scores, best first."""
+    k = min(k, len(scores))
+    if k == 0:
+        return np.empty(0, dtype=np.int64)
+    idx = np.argpartition(-scores, k - 1)[:k]
+    return idx[np.argsort(-scores[idx])]
+
+
+class IVFIndex:
+    """Inverted-file index with optional product quantization, scored by inner product."""
+
+    def __init__(self, nlist=256, nprobe=8, pq_m=0, rerank=64, seed=0):
+        """
+        Args:
+            nlist (int): Number of k-means cells.
+            nprobe (int): Cells scanned per query (higher = better recall, slower).
+            pq_m (int): Product-quantization sub-vectors per vector; 0 stores vectors exactly.
+                Must divide the embedding dimension (384 = 2^7 * 3, so 8, 16, 32, 48, 96 work).
+            rerank (int): With PQ, this many best candidates are re-scored exactly.
+            seed (int): Random seed for k-means.
+        """
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.pq_m = pq_m
+        self.rerank = rerank
+        self.seed = seed
+
+    def build(self, vectors):
+        """Train the cells (and codebooks) and assign every vector; rows are the ids."""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.vectors = vectors
+        nlist = max(1, min(self.nlist, len(vectors) // 39 or 1)) # Keep ~40 training points per cell
+        self.centroids = _kmeans(vectors, nlist, seed=self.seed)
+        assign = _nearest(vectors, self.centroids)
+        order = np.argsort(assign, kind="stable")
+        self.ids = order # Row ids grouped by cell: one compact array plus offsets
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=len(self.centroids)))])
+        if self.pq_m:
+            dim = vectors.shape[1]
+            if dim % self.pq_m:
+                raise ValueError(f"pq_m={self.pq_m} does not divide the embedding dimension {dim}")
+            self.dsub = dim // self.pq_m
+            self.codebooks = []
+            codes = np.empty((len(vectors), self.pq_m), dtype=np.uint8)
+            for j in range(self.pq_m):
+                sub = vectors[:, j * self.dsub:(j + 1) * self.dsub]
+                book = _kmeans(sub, 256, seed=self.seed + j)
+                self.codebooks.append(book)
+                codes[:, j] = _nearest(sub, book)
+            self.codes = codes[order] # Stored in cell order, next to self.ids
+        return self
+
+    def search(self, query, top_k=10, nprobe=None, rerank=None):
+        """
+        Return ``(row_ids, scores)`` of the approximate ``top_k`` inner-product neighbours.
+        """
+        query = np.asarray(query, dtype=np.float32).ravel()
+        nprobe = nprobe or self.nprobe
+        rerank = self.rerank if rerank is None else rerank
+        cells = _top_k(self.centroids @ query, nprobe)
+        ranges = [(self.offsets[c], self.offsets[c + 1]) for c in cells]
+        positions = np.concatenate([np.arange(a, b) for a, b in ranges]) if ranges else np.empty(0, dtype=np.int64)
+        if not len(positions):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        if self.pq_m:
+            tables = np.stack([book @ query[j * self.dsub:(j + 1) * self.dsub]
+                               for j, book in enumerate(self.codebooks)]) # (pq_m, 256) partial inner products
+            codes = self.codes[positions]
+            approx = tables[np.arange(self.pq_m), codes].sum(axis=1)
+            if rerank:
+                best = _top_k(approx, max(rerank, top_k))
+                ids = self.ids[positions[best]]
+                scores = self.vectors[ids] @ query # Exact re-scoring of the short list
+            else:
+                ids, scores = self.ids[positions], approx
+        else:
+            ids = self.ids[positions]
+            scores = self.vectors[ids] @ query
+        best = _top_k(scores, top_k)
+        return ids[best], scores[best]
+
+
+    def search_batch(self, queries, top_k=10, nprobe=None, rerank=None):
+        """
+        ``search`` for every row of the (queries, dim) ``queries``; returns a list of ``(row_ids, scores)``.
+
+        Without PQ the queries are grouped by probed cell, so each cell's vectors are
+        gathered once and scored against all of its queries in one matrix multiply.
+        """
+        queries = np.array(queries, dtype=np.float32, ndmin=2)
+        if self.pq_m: # The lookup tables are per query anyway
+            return [self.search(q, top_k, nprobe, rerank) for q in queries]
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        probes = np.argpartition(-(queries @ self.centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+        by_cell = {} # Cell -> queries probing it
+        for q, cells in enumerate(probes):
+            for c in cells:
+                by_cell.setdefault(int(c), []).append(q)
+        found_ids = [[] for _ in queries]
+        found_scores = [[] for _ in queries]
+        for c, qs in by_cell.items():
+            ids = self.ids[self.offsets[c]:self.offsets[c + 1]]
+            if not len(ids):
+                continue
+            scores = self.vectors[ids] @ queries[qs].T # (cell size, queries of this cell)
+            for j, q in enumerate(qs):
+                found_ids[q].append(ids)
+                found_scores[q].append(scores[:, j])
+        results = []
+        for ids, scores in zip(found_ids, found_scores):
+            if not ids:
+                results.append((np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)))
+                continue
+            ids, scores = np.concatenate(ids), np.concatenate(scores)
+            best = _top_k(scores, top_k)
+            results.append((ids[best], scores[best]))
+        return results
+
+
+class ANNDocumentStore(InMemoryDocumentStore):
+    """InMemoryDocumentStore that answers ``query_by_embedding`` from an ``IVFIndex``."""
+
+    def __init__(self, nlist=256, nprobe=8, pq_m=0, rerank=64, min_docs=5000, **kwargs):
+        """
+        Args:
+            nlist, nprobe, pq_m, rerank: See ``IVFIndex``.
+            min_docs (int): Below this many documents exact search is used; it is fast
+                enough and the index would not pay for itself.
+            **kwargs: Passed to ``InMemoryDocumentStore`` (e.g. ``embedding_dim``).
+        """
+        super().__init__(**kwargs)
+        self.ann_params = {"nlist": nlist, "nprobe": nprobe, "pq_m": pq_m, "rerank": rerank}
+        self.min_docs = min_docs
+        self._ann = {} # Index name -> (IVFIndex, documents in row order)
+
+    def write_documents(self, *args, **kwargs):
+        self._ann.clear() # Rebuilt lazily on the next query
+        return super().write_documents(*args, **kwargs)
+
+    def update_embeddings(self, *args, **kwargs):
+        self._ann.clear()
+        return super().update_embeddings(*args, **kwargs)
+
+    def delete_documents(self, *args, **kwargs):
+        self._ann.clear()
+        return super().delete_documents(*args, **kwargs)
+
+    def _get_ann(self, index):
+        if index not in self._ann:
+            docs = [d for d in self.get_all_documents(index=index, return_embedding=True) if d.embedding is not None]
+            if not docs or len(docs) < self.min_docs:
+                self._ann[index] = None
+            else:
+                vectors = np.stack([d.embedding for d in docs]).astype(np.float32)
+                if self.similarity == "cosine":
+                    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+                self._ann[index] = (IVFIndex(**self.ann_params).build(vectors), docs)
+        return self._ann[index]
+
+    def uses_index(self, index=None):
+        """True when queries go through the IVF index, i.e. the store holds at least ``min_docs`` documents."""
+        return self._get_ann(index or self.index) is not None
+
+    def ann_search(self, query_embs, top_k=10, index=None, return_embedding=False, scale_score=True):
+        """
+        Top-k documents for every row of the (queries, dim) ``query_embs`` from the IVF index.
+
+        Returns None when the index is below ``min_docs`` and search is exact, so the
+        caller can use its own exact path (``batch_query.retrieve_by_embeddings``).
+        """
+        ann = self._get_ann(index or self.index)
+        if ann is None:
+            return None
+        ivf, docs = ann
+        queries = np.array(query_embs, dtype=np.float32, ndmin=2)
+        if self.similarity == "cosine":
+            queries = queries / (np.linalg.norm(queries, axis=1, keepdims=True) + 1e-12)
+        results = []
+        for ids, scores in ivf.search_batch(queries, top_k):
+            hits = []
+            for row, score in zip(ids, scores):
+                doc = copy.copy(docs[row])
+                doc.score = self.scale_to_unit_interval(float(score), self.similarity) if scale_score else float(score)
+                if not return_embedding:
+                    doc.embedding = None
+                hits.append(doc)
+            results.append(hits)
+        return results
+
+    def query_by_embedding(self, query_emb, filters=None, top_k=10, index=None,
+                           return_embedding=None, headers=None, scale_score=True):
+        index = index or self.index
+        if return_embedding is None:
+            return_embedding = self.return_embedding
+        results = None if filters else self.ann_search(query_emb, top_k, index, return_embedding, scale_score) # Filtered queries stay exact
+        if results is None:
+            return super().query_by_embedding(query_emb, filters=filters, top_k=top_k, index=index,
+                                              return_embedding=return_embedding, headers=headers,
+                                              scale_score=scale_score)
+        return results[0]
+
+
+def benchmark(vectors, queries, top_k=10, configs=None):
+    """
+    Compare IVF/IVF-PQ configurations against exact search.
+
+    Returns:
+        list: One dict per configuration with build time, mean query latency (ms)
+        and recall@top_k against the exact neighbours.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    configs = configs or [
+        {"nlist": 256, "nprobe": 4, "pq_m": 0},
+        {"nlist": 256, "nprobe": 16, "pq_m": 0},
+        {"nlist": 256, "nprobe": 16, "pq_m": 48, "rerank": 100},
+    ]
+    start = time.perf_counter()
+    exact = [set(_top_k(vectors @ q, top_k)) for q in queries]
+    rows = [{"config": "exact", "build_s": 0.0, "latency_ms": (time.perf_counter() - start) * 1000 / len(queries), "recall": 1.0}]
+    for config in configs:
+        start = time.perf_counter()
+        index = IVFIndex(**config).build(vectors)
+        build_s = time.perf_counter() - start
+        start = time.perf_counter()
+        found = [set(index.search(q, top_k)[0]) for q in queries]
+        latency_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        recall = float(np.mean([len(f & e) / len(e) for f, e in zip(found, exact)]))
+        rows.append({"config": config, "build_s": build_s, "latency_ms": latency_ms, "recall": recall})
+    return rows
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(500, 384)).astype(np.float32) # Clustered data behaves like real embeddings
+    data = centers[rng.integers(0, 500, 100000)] + 0.3 * rng.normal(size=(100000, 384)).astype(np.float32)
+    data /= np.linalg.norm(data, axis=1, keepdims=True)
+    queries = data[rng.choice(len(data), 200, replace=False)] + 0.05 * rng.normal(size=(200, 384)).astype(np.float32)
+    for row in benchmark(data, queries):
+        print(f"{str(row['config']):60s} build {row['build_s']:6.1f}s  query {row['latency_ms']:7.2f} ms  recall@10 {row['recall']:.3f}")
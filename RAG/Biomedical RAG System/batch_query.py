@@ -0,0 +1,126 @@
+# By Alexandros Panagiotakopoulos
+# Copyright (c) 2025 Alexandros Panagiotakopoulos. All rights reserved.
+# Date: 20/06/2025
+
+"""
+Batch query API for the RAG pipeline built by ``build_haystack_pipeline()``.
+
+``run_batch`` answers many questions at once instead of calling ``pipe.run`` per
+question: all queries are embedded together, retrieval for the whole batch is a single
+(queries x documents) matrix multiply, and the prompts are generated in padded batches
+through the PromptNode's underlying transformers pipeline.
+"""
+
+import copy
+
+import numpy as np
+
+from profiling import stage
+
+
+PROMPT_TEXT = "Given the context, answer the question.\nContext: {join(documents)}\nQuestion: {query}\nAnswer:"
+
+
+def format_prompt(query, documents):
+    """Fill ``PROMPT_TEXT`` the way the PromptNode's ``PromptTemplate`` does."""
+    context = " ".join(doc.content for doc in documents) # join() uses a single space by default
+    return PROMPT_TEXT.replace("{join(documents)}", context).replace("{query}", query)
+
+
+def document_matrix(document_store):
+    """
+    Return ``(documents, matrix)`` with every embedded document and its (n, dim) embeddings.
+
+    The result is cached on the store and rebuilt when its document or embedding
+    count changes.
+    """
+    key = (document_store.get_document_count(), document_store.get_embedding_count())
+    cached = getattr(document_store, "_batch_matrix", None)
+    if cached is None or cached[0] != key:
+        stored = [d for d in document_store.get_all_documents(return_embedding=True) if d.embedding is not None]
+        matrix = np.stack([d.embedding for d in stored]).astype(np.float32) if stored else np.zeros((0, 1), np.float32)
+        if document_store.similarity == "cosine":
+            matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12
+        docs = []
+        for d in stored: # The matrix holds the vectors; keep shallow copies without a second copy of each
+            d = copy.copy(d)
+            d.embedding = None
+            docs.append(d)
+        cached = document_store._batch_matrix = (key, docs, matrix)
+    return cached[1], cached[2]
+
+
+def retrieve_batch(retriever, queries, top_k=5, q_emb=None):
+    """Embed all ``queries`` together (unless ``q_emb`` is given) and return the ``top_k`` documents for each."""
+    if q_emb is None:
+        q_emb = retriever.embed_queries(queries) # Batched by the retriever's batch_size
+    if hasattr(retriever, "retrieve_with_embeddings"): # bm25.HybridRetriever also needs the query text
+        return retriever.retrieve_with_embeddings(queries, q_emb, top_k)
+    return retrieve_by_embeddings(retriever.document_store, q_emb, top_k)
+
+
+def retrieve_by_embeddings(store, q_emb, top_k=5):
+    """Return the ``top_k`` documents of ``store`` for each row of the (queries, dim) ``q_emb``."""
+    if hasattr(store, "ann_search"): # ann_store.ANNDocumentStore: its IVF index, or None below min_docs
+        results = store.ann_search(q_emb, top_k)
+        if results is not None:
+            return results
+    docs, matrix = document_matrix(store) # Exact search
+    q_emb = np.array(q_emb, dtype=np.float32, ndmin=2)
+    if store.similarity == "cosine":
+        q_emb /= np.linalg.norm(q_emb, axis=1, keepdims=True) + 1e-12
+    scores = q_emb @ matrix.T # (queries, documents) in one matrix multiply
+    k = min(top_k, len(docs))
+    results = []
+    for row in scores:
+        if k == 0:
+            results.append([])
+            continue
+        top = np.argpartition(-row, k - 1)[:k]
+        top = top[np.argsort(-row[top])]
+        hits = []
+        for i in top:
+            doc = copy.copy(docs[i]) # Fresh copy, so scores don't leak between queries
+            doc.score = store.scale_to_unit_interval(float(row[i]), store.similarity)
+            hits.append(doc)
+        results.append(hits)
+    return results
+
+
+def generate_batch(prompt_node, prompts, batch_size=8):
+    """Generate one answer per prompt, ``batch_size`` prompts per padded forward pass."""
+    layer = getattr(getattr(prompt_node, "prompt_model", None), "model_invocation_layer", None)
+    hf_pipe = getattr(layer, "pipe", None)
+    if hf_pipe is None: # Not a local Hugging Face model: fall back to one call per prompt
+        return [prompt_node(prompt)[0] for prompt in prompts]
+    order = sorted(range(len(prompts)), key=lambda i: len(prompts[i])) # Similar lengths -> less padding
+    outputs = hf_pipe([prompts[i] for i in order], batch_size=batch_size, truncation=True,
+                      max_length=getattr(prompt_node, "max_length", 100))
+    answers = [None] * len(prompts)
+    for i, out in zip(order, outputs):
+        out = out[0] if isinstance(out, list) else out
+        answers[i] = out["generated_text"].strip()
+    return answers
+
+
+def run_batch(pipe, queries, top_k=5, batch_size=8):
+    """
+    Answer a list of questions with the Retriever and PromptNode of ``pipe``.
+
+    Args:
+        pipe: The pipeline returned by ``build_haystack_pipeline()``.
+        queries (list): The questions.
+        top_k (int): Documents retrieved per question.
+        batch_size (int): Prompts per generation batch.
+
+    Returns:
+        list: One ``{"query", "documents", "answer"}`` dict per question, in order.
+    """
+    retriever = pipe.get_node("Retriever")
+    prompt_node = pipe.get_node("PromptNode")
+    with stage("retrieval", items=len(queries)):
+        retrieved = retrieve_batch(retriever, queries, top_k)
+    prompts = [format_prompt(q, docs) for q, docs in zip(queries, retrieved)]
+    with stage("generation", items=len(prompts)):
+        answers = generate_batch(prompt_node, prompts, batch_size)
+    return [{"query": q, "documents": docs, "answer": a} for q, docs, a in zip(queries, retrieved, answers)]
@@ -0,0 +1,109 @@
+# By Alexandros Panagiotakopoulos
+# Copyright (c) 2025 Alexandros Panagiotakopoulos. All rights reserved.
+# Date: 20/06/2025
+
+"""
+Streaming reader for the BioASQ training JSON.
+
+``training13b.json`` is one large object of the form ``{"questions": [ {...}, ... ]}``
+(filtered exports are a bare ``[ {...}, ... ]`` list, which is accepted as well).
+Instead of ``json.load``-ing all of it, ``iter_questions`` reads the file in fixed-size
+chunks and decodes one question object at a time with ``json.JSONDecoder.raw_decode``,
+so memory stays bounded by the largest single question rather than the file size.
+"""
+
+import json
+
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+_NUMBER_CHARS = "0123456789.eE+-"
+
+
+class _Reader:
+    """A sliding text buffer over a file that refills on demand."""
+
+    def __init__(self, f, chunk_size):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk # Drop what has already been consumed
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Return the next non-whitespace character without consuming it ('' at EOF)."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, ch):
+        if self.peek() != ch:
+            raise ValueError(f"Malformed JSON: expected {ch!r} near offset {self.pos}")
+        self.pos += 1
+
+    def value(self):
+        """Decode the next complete JSON value, reading more of the file until it fits."""
+        self.peek()
+        while True:
+            try:
+                obj, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            number = isinstance(obj, (int, float)) and not isinstance(obj, bool)
+            if (end == len(self.buf) or (number and self.buf[end] in _NUMBER_CHARS)) and not self.eof and self._fill():
+                continue # A number cut at the chunk edge ("1." | "5", "1e" | "3") continues in the next chunk
+            self.pos = end
+            return obj
+
+
+def iter_questions(path, key="questions", chunk_size=1 << 16):
+    """
+    Yield the items of the top-level ``key`` array one at a time.
+
+    Args:
+        path (str): Path of the BioASQ JSON file.
+        key (str): Name of the top-level array to stream.
+        chunk_size (int): Number of characters read per refill.
+
+    Yields:
+        dict: One question item at a time.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        reader = _Reader(f, chunk_size)
+        if reader.peek() == "[": # Filtered exports are a bare list of questions
+            yield from _iter_array(reader)
+            return
+        reader.expect("{")
+        while reader.peek() != "}":
+            name = reader.value()
+            reader.expect(":")
+            if name == key:
+                yield from _iter_array(reader)
+            else:
+                reader.value() # Other top-level fields are decoded and dropped
+            if reader.peek() == ",":
+                reader.pos += 1
+
+
+def _iter_array(reader):
+    reader.expect("[")
+    while reader.peek() != "]":
+        yield reader.value()
+        if reader.peek() == ",":
+            reader.pos += 1
+    reader.expect("]")
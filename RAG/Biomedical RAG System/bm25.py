@@ -0,0 +1,202 @@
+# By Alexandros Panagiotakopoulos
+# Copyright (c) 2025 Alexandros Panagiotakopoulos. All rights reserved.
+# Date: 20/06/2025
+
+"""
+BM25 inverted index and hybrid (BM25 + dense) retrieval with reciprocal rank fusion.
+
+Dense retrieval alone tends to miss exact medical acronyms such as "CLL", "DLBCL" or
+"CAR-T"; BM25 matches them literally. ``BM25Index`` keeps one compact postings list per
+term (document ids in an ``array('I')`` and term frequencies in an ``array('H')``), and
+only the postings of the query terms are touched at query time.
+
+``HybridRetriever`` is a haystack node that replaces the plain ``EmbeddingRetriever`` in
+the pipeline. In "rrf" mode it fuses the BM25 and dense rankings with reciprocal rank
+fusion; in "prefilter" mode BM25 first selects a candidate set and only those documents
+are scored densely (falling back to full dense search when BM25 finds too little, e.g.
+for a Greek question over English documents). ``hybrid_rank`` is the per-query ranking
+shared with the per-language partitions of ``lang_router.LanguageRouter``.
+"""
+
+import re
+import copy
+import math
+import unicodedata
+from array import array
+
+import numpy as np
+
+from haystack.nodes.base import BaseComponent
+
+from batch_query import document_matrix
+
+
+TOKEN = re.compile(r"\w+(?:-\w+)*") # Keeps hyphenated acronyms such as "car-t" together
+
+
+def tokenize(text):
+    """Case-folded, accent-stripped word tokens; hyphenated words also yield their parts."""
+    text = unicodedata.normalize("NFD", text.casefold())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)) # "λευχαιμία" == "λευχαιμια"
+    tokens = []
+    for tok in TOKEN.findall(text):
+        tokens.append(tok)
+        if "-" in tok:
+            tokens.extend(tok.split("-"))
+    return tokens
+
+
+class BM25Index:
+    """Okapi BM25 over an inverted index with compact postings lists."""
+
+    def __init__(self, texts, k1=1.5, b=0.75):
+        """
+        Args:
+            texts (list): Document texts; their positions are the document ids.
+            k1 (float): Term-frequency saturation.
+            b (float): Length normalization.
+        """
+        self.k1 = k1
+        self.b = b
+        self.doc_ids = {} # term -> array('I') of document ids (ascending)
+        self.freqs = {} # term -> array('H') of term frequencies, parallel to doc_ids
+        self.doc_len = array("I")
+        for doc_id, text in enumerate(texts):
+            counts = {}
+            tokens = tokenize(text)
+            for tok in tokens:
+                counts[tok] = counts.get(tok, 0) + 1
+            self.doc_len.append(len(tokens))
+            for tok, tf in counts.items():
+                if tok not in self.doc_ids:
+                    self.doc_ids[tok] = array("I")
+                    self.freqs[tok] = array("H")
+                self.doc_ids[tok].append(doc_id)
+                self.freqs[tok].append(min(tf, 65535))
+        self.n_docs = len(self.doc_len)
+        self.avg_len = (sum(self.doc_len) / self.n_docs) if self.n_docs else 0.0
+
+    def idf(self, term):
+        df = len(self.doc_ids.get(term, ()))
+        return math.log(1 + (self.n_docs - df + 0.5) / (df + 0.5))
+
+    def search(self, query, top_k=10):
+        """
+        Return up to ``top_k`` ``(doc_id, score)`` pairs, best first.
+        """
+        scores = {}
+        k1, b, avg_len, doc_len = self.k1, self.b, self.avg_len or 1.0, self.doc_len
+        for term in set(tokenize(query)):
+            ids = self.doc_ids.get(term)
+            if ids is None:
+                continue
+            idf = self.idf(term)
+            for doc_id, tf in zip(ids, self.freqs[term]):
+                norm = k1 * (1 - b + b * doc_len[doc_id] / avg_len)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: -item[1])[:top_k]
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    Fuse several rankings (lists of ids, best first) into one.
+
+    Returns:
+        list: ``(id, fused score)`` pairs, best first; score = sum of 1 / (k + rank).
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: -item[1])
+
+
+def hybrid_rank(query, emb, matrix, bm25, top_k=5, mode="rrf", candidates=100, rrf_k=60, scores=None):
+    """
+    Hybrid ranking of one query over ``matrix`` and the ``bm25`` index of the same documents.
+
+    Args:
+        query (str): Question text, for BM25.
+        emb (numpy.ndarray): Query embedding, normalized like the rows of ``matrix``.
+        scores (numpy.ndarray): Optional precomputed dense scores of every row of ``matrix``;
+            ``matrix`` and ``emb`` are then not used.
+
+    Returns:
+        tuple: ``(hits, best_dense)`` with up to ``top_k`` ``(doc_id, fused score)`` pairs,
+        best first, and the highest dense similarity seen (None when nothing was scored).
+    """
+    lexical = [doc_id for doc_id, _ in bm25.search(query, candidates)]
+    if mode == "prefilter" and len(lexical) >= top_k:
+        pool = np.array(lexical, dtype=np.int64) # Dense scoring restricted to the BM25 candidates
+    else:
+        pool = None
+    if scores is None:
+        scores = (matrix[pool] if pool is not None else matrix) @ emb
+    elif pool is not None:
+        scores = scores[pool]
+    n = min(candidates, len(scores))
+    best = np.argpartition(-scores, n - 1)[:n] if n else np.empty(0, dtype=np.int64)
+    best = best[np.argsort(-scores[best])]
+    dense = (pool[best] if pool is not None else best).tolist()
+    best_dense = float(scores[best[0]]) if n else None
+    return reciprocal_rank_fusion([lexical, dense], rrf_k)[:top_k], best_dense
+
+
+class HybridRetriever(BaseComponent):
+    """BM25 + dense retrieval node, fused with reciprocal rank fusion."""
+
+    outgoing_edges = 1
+
+    def __init__(self, dense_retriever, mode="rrf", top_k=5, candidates=100, rrf_k=60):
+        """
+        Args:
+            dense_retriever: The ``EmbeddingRetriever`` (its document store is searched).
+            mode (str): "rrf" fuses full BM25 and dense rankings; "prefilter" scores only
+                the BM25 candidates densely.
+            top_k (int): Documents returned by default.
+            candidates (int): Length of each ranking before fusion / size of the BM25 candidate set.
+            rrf_k (int): Reciprocal rank fusion constant.
+        """
+        super().__init__()
+        self.dense = dense_retriever
+        self.document_store = dense_retriever.document_store
+        self.mode = mode
+        self.top_k = top_k
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+        self._bm25 = None # (documents the index was built from, BM25Index)
+
+    def embed_queries(self, queries):
+        return self.dense.embed_queries(queries)
+
+    def _index(self):
+        docs, matrix = document_matrix(self.document_store)
+        if self._bm25 is None or self._bm25[0] is not docs: # Rebuilt together with the dense matrix
+            self._bm25 = (docs, BM25Index([d.content for d in docs]))
+        return docs, matrix, self._bm25[1]
+
+    def retrieve_with_embeddings(self, queries, q_emb, top_k=None):
+        """Hybrid top-k documents for each query, given the precomputed query embeddings."""
+        top_k = top_k or self.top_k
+        docs, matrix, bm25 = self._index()
+        q_emb = np.array(q_emb, dtype=np.float32, ndmin=2)
+        if self.document_store.similarity == "cosine":
+            q_emb /= np.linalg.norm(q_emb, axis=1, keepdims=True) + 1e-12
+        results = []
+        for query, emb in zip(queries, q_emb):
+            hits = []
+            ranked, _ = hybrid_rank(query, emb, matrix, bm25, top_k, self.mode, self.candidates, self.rrf_k)
+            for doc_id, score in ranked:
+                doc = copy.copy(docs[doc_id])
+                doc.score = score
+                hits.append(doc)
+            results.append(hits)
+        return results
+
+    def run(self, query, top_k=None):
+        documents = self.retrieve_with_embeddings([query], self.embed_queries([query]), top_k)[0]
+        return {"documents": documents}, "output_1"
+
+    def run_batch(self, queries, top_k=None):
+        queries = [queries] if isinstance(queries, str) else queries
+        return {"documents": self.retrieve_with_embeddings(queries, self.embed_queries(queries), top_k)}, "output_1"
@@ -0,0 +1,205 @@
+# By Alexandros Panagiotakopoulos
+# Copyright (c) 2025 Alexandros Panagiotakopoulos. All rights reserved.
+# Date: 20/06/2025
+
+"""
+Sentence-aware text chunking.
+
+Chunks are computed as ``(start, end)`` offsets into the original text from a single
+regex pass over the sentence and paragraph boundaries. Sentences are packed greedily
+into chunks of at most ``max_chars`` characters without any string concatenation, a
+paragraph break always starts a new chunk, and a sentence longer than ``max_chars`` is
+cut into ``max_chars`` pieces. Used by ``fetcher_translator.py`` and the
+``translate_to_greek`` variants in ``RAG.py``.
+
+``chunk_documents`` applies the same sentence spans to the corpus before embedding:
+token-length windows with overlap, each chunk carrying its source offsets in ``meta``.
+Tokens can be counted with the generator's tokenizer (``TokenCounter``); the windows of
+every document are then cached by content hash, so an unchanged corpus is not
+tokenized again on the next start.
+"""
+
+import os
+import re
+import json
+import hashlib
+
+
+TOKEN = re.compile(r'\w+|[^\w\s]') # Words and punctuation; a cheap stand-in for subword token counts
+BOUNDARY = re.compile(r'\s*\n\s*\n\s*|(?<=[.!?])\s+') # Paragraph break, or whitespace after end-of-sentence punctuation
+
+
+def sentence_spans(text):
+    """
+    Yield ``(start, end, new_paragraph)`` for every sentence in ``text``.
+
+    ``new_paragraph`` is True when a paragraph break precedes the sentence.
+    Surrounding whitespace is not part of the span.
+    """
+    start = len(text) - len(text.lstrip()) # Skip leading whitespace
+    new_paragraph = False
+    for m in BOUNDARY.finditer(text):
+        if m.start() > start:
+            yield start, m.start(), new_paragraph
+            new_paragraph = False
+        new_paragraph = new_paragraph or m.group().count("\n") >= 2
+        start = m.end()
+    end = len(text.rstrip())
+    if end > start:
+        yield start, end, new_paragraph
+
+
+def chunk_spans(text, max_chars=5000):
+    """
+    Split ``text`` into chunks of whole sentences.
+
+    Args:
+        text (str): The text to split.
+        max_chars (int): Maximum characters per chunk.
+
+    Returns:
+        list: ``(start, end)`` offsets of the chunks; ``text[start:end]`` is the chunk.
+    """
+    spans = []
+    chunk_start = chunk_end = None
+    for start, end, new_paragraph in sentence_spans(text):
+        if chunk_start is not None and (new_paragraph or end - chunk_start > max_chars):
+            spans.append((chunk_start, chunk_end)) # Flush the current chunk
+            chunk_start = None
+        if end - start > max_chars: # A single oversized sentence: cut it by characters
+            for i in range(start, end, max_chars):
+                spans.append((i, min(i + max_chars, end)))
+            continue
+        if chunk_start is None:
+            chunk_start = start
+        chunk_end = end
+    if chunk_start is not None:
+        spans.append((chunk_start, chunk_end))
+    return spans
+
+
+def split_chunks(text, max_chars=5000):
+    """Return the chunk strings of ``text`` (see ``chunk_spans``)."""
+    return [text[start:end] for start, end in chunk_spans(text, max_chars)]
+
+
+def _token_sentences(text, max_tokens, count_tokens=None):
+    """Sentence spans with token counts; sentences over ``max_tokens`` are cut at token boundaries."""
+    sentences = []
+    for start, end, _ in sentence_spans(text):
+        tokens = [m.span() for m in TOKEN.finditer(text, start, end)]
+        if not tokens:
+            continue
+        if count_tokens is None:
+            for i in range(0, len(tokens), max_tokens): # Usually a single iteration
+                piece = tokens[i:i + max_tokens]
+                sentences.append((start if i == 0 else piece[0][0], end if i + max_tokens >= len(tokens) else piece[-1][1], len(piece)))
+            continue
+        pending = [tokens] # Halve oversized sentences at word boundaries until every piece fits
+        while pending:
+            piece = pending.pop()
+            n = count_tokens(text[piece[0][0]:piece[-1][1]])
+            if n > max_tokens and len(piece) > 1:
+                half = len(piece) // 2
+                pending += [piece[half:], piece[:half]] # Popped first half first, keeping text order
+            else:
+                sentences.append((piece[0][0], piece[-1][1], n))
+    return sentences
+
+
+def token_windows(text, max_tokens=100, overlap_tokens=20, count_tokens=None):
+    """
+    Pack whole sentences into windows of at most ``max_tokens`` tokens.
+
+    Consecutive windows share trailing sentences worth up to ``overlap_tokens`` tokens,
+    so a fact that straddles a window edge is still retrievable in one piece. Tokens are
+    ``TOKEN`` matches unless ``count_tokens`` (text -> token count, e.g. a model's
+    tokenizer) is given.
+
+    Returns:
+        list: ``(start, end)`` character offsets of the windows.
+    """
+    sentences = _token_sentences(text, max_tokens, count_tokens)
+    windows = []
+    i = 0
+    while i < len(sentences):
+        j, tokens = i, 0
+        while j < len(sentences) and (j == i or tokens + sentences[j][2] <= max_tokens):
+            tokens += sentences[j][2]
+            j += 1
+        windows.append((sentences[i][0], sentences[j - 1][1]))
+        if j == len(sentences):
+            break
+        next_i, overlap = j, 0 # Step back over trailing sentences for the overlap, leaving room for the next new sentence
+        while (next_i - 1 > i and overlap + sentences[next_i - 1][2] <= overlap_tokens
+               and overlap + sentences[next_i - 1][2] + sentences[j][2] <= max_tokens):
+            next_i -= 1
+            overlap += sentences[next_i][2]
+        i = next_i
+    return windows
+
+
+class TokenCounter:
+    """Token count of a text with a Hugging Face tokenizer, loaded on first use."""
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self.available = True # False once loading failed; ``TOKEN`` matches are counted instead
+        self._tokenizer = None
+
+    def __call__(self, text):
+        if self._tokenizer is None and self.available:
+            try:
+                from transformers import AutoTokenizer
+                self._tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+            except (ImportError, OSError) as e:
+                print(f"[Chunking] Tokenizer of {self.model_name} unavailable ({e}); counting words and punctuation instead.")
+                self.available = False
+        if not self.available:
+            return len(TOKEN.findall(text))
+        return len(self._tokenizer(text, add_special_tokens=False)["input_ids"])
+
+
+def _load_span_cache(path, key):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return cached.get("spans", {}) if cached.get("key") == key else {}
+
+
+def chunk_documents(docs, max_tokens=100, overlap_tokens=20, count_tokens=None, cache_path=None):
+    """
+    Split corpus documents into overlapping, sentence-aligned chunks.
+
+    Args:
+        docs (list): ``{"content": ..., "meta": {...}}`` dicts as returned by ``load_biomedical_documents``.
+        max_tokens (int): Maximum tokens per chunk.
+        overlap_tokens (int): Tokens shared by consecutive chunks of the same document.
+        count_tokens (callable): Token count of a text; defaults to counting ``TOKEN`` matches.
+        cache_path (str): Optional JSON file keeping each document's windows between runs,
+            keyed by content hash, ``max_tokens``, ``overlap_tokens`` and the tokenizer.
+
+    Returns:
+        list: Chunk dicts; ``meta`` keeps the source meta and adds ``chunk_index``,
+        ``source_start`` and ``source_end`` (character offsets into the source document).
+    """
+    key = f"{max_tokens}:{overlap_tokens}:{getattr(count_tokens, 'model_name', 'words') if count_tokens else 'words'}"
+    cached = _load_span_cache(cache_path, key) if cache_path else {}
+    spans = {} # Content hash -> windows of this run; documents no longer in the corpus are dropped
+    chunks = []
+    for doc in docs:
+        text = doc["content"]
+        h = hashlib.sha1(text.encode("utf-8")).hexdigest() # Same digest as embedding_index.content_hash
+        if h not in spans:
+            spans[h] = cached.get(h) or token_windows(text, max_tokens, overlap_tokens, count_tokens)
+        for idx, (start, end) in enumerate(spans[h]):
+            meta = dict(doc["meta"], chunk_index=idx, source_start=start, source_end=end)
+            chunks.append({"content": text[start:end], "meta": meta})
+    if cache_path and getattr(count_tokens, "available", True) and spans.keys() != cached.keys(): # Word-count fallbacks are not cached under the tokenizer's name
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        with open(cache_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"key": key, "spans": spans}, f)
+        os.replace(cache_path + ".tmp", cache_path)
+    return chunks
@@ -0,0 +1,213 @@
+# By Alexandros Panagiotakopoulos
+# Copyright (c) 2025 Alexandros Panagiotakopoulos. All rights reserved.
+# Date: 20/06/2025
+
+"""
+Compact, memory-mapped vector store for serving large corpora.
+
+``InMemoryDocumentStore`` keeps every chunk as a Python ``Document`` with a float32
+embedding, so memory grows much faster than the corpus text. ``CompactVectorStore``
+keeps the same information in three files:
+
+    vectors.npy   contiguous (n, dim) float16, or int8 with one scale per dimension
+    blob.bin      the documents as UTF-8 JSON records ({"id", "content", "meta"}), back to back
+    offsets.npy   (n + 1) int64 byte offsets of the records in blob.bin
+
+All three are memory-mapped: only the vector codes are scanned per query, and only the
+records of the returned hits are decoded. With int8 codes a 384-dim chunk costs 384 bytes
+instead of 1.5 KB plus its Python objects. Quantized scores are approximate, so the best
+``rescore`` candidates are re-scored against full-precision vectors (the embedding
+index memmap) before the final ``top_k`` is taken.
+
+``CompactRetriever`` is the matching haystack node; ``build_haystack_pipeline()`` uses it
+when ``VECTOR_STORE = "compact"``.
+"""
+
+import os
+import json
+import math
+
+import numpy as np
+
+from haystack.nodes.base import BaseComponent
+from haystack.schema import Document
+
+
+META_NAME = "store.json"
+VECTORS_NAME = "vectors.npy"
+BLOB_NAME = "blob.bin"
+OFFSETS_NAME = "offsets.npy"
+
+
+def _normalized(block):
+    return block / (np.linalg.norm(block, axis=1, keepdims=True) + 1e-12)
+
+
+def _scale_score(score, similarity):
+    """Same mapping to [0, 1] as haystack's ``scale_to_unit_interval``."""
+    if similarity == "cosine":
+        return (score + 1) / 2
+    return float(1 / (1 + math.exp(-score / 100)))
+
+
+class CompactVectorStore:
+    """Read-only, memory-mapped store of quantized vectors and serialized documents."""
+
+    def __init__(self, folder, full_vectors=None, rescore=100, block=65536):
+        """
+        Args:
+            folder (str): Folder written by ``CompactVectorStore.build``.
+            full_vectors (numpy.ndarray): Optional full-precision (n, dim) vectors in the same
+                row order (e.g. ``EmbeddingIndex.vectors``), used to re-score the candidates.
+            rescore (int): Candidates per query re-scored with ``full_vectors``.
+            block (int): Rows scored per step, bounding the float32 temporary.
+        """
+        with open(os.path.join(folder, META_NAME), "r", encoding="utf-8") as f:
+            self.info = json.load(f)
+        self.similarity = self.info["similarity"]
+        self.codes = np.load(os.path.join(folder, VECTORS_NAME), mmap_mode="r")
+        self.scale = np.asarray(self.info["scale"], dtype=np.float32) if self.info["dtype"] == "int8" else None
+        self.offsets = np.load(os.path.join(folder, OFFSETS_NAME), mmap_mode="r")
+        blob_path = os.path.join(folder, BLOB_NAME)
+        self.blob = np.memmap(blob_path, dtype=np.uint8, mode="r") if os.path.getsize(blob_path) else np.zeros(0, np.uint8)
+        self.full_vectors = full_vectors
+        self.rescore = rescore
+        self.block = block
+
+    @classmethod
+    def build(cls, folder, documents, vectors, dtype="int8", similarity="cosine", version="", block=65536):
+        """
+        Write a store for ``documents`` and their (n, dim) ``vectors``.
+
+        Vectors are read in blocks, so ``vectors`` can be a memmap larger than memory.
+
+        Args:
+            folder (str): Output folder.
+            documents (list): Haystack ``Document`` objects (or dicts with "content" and "meta").
+            vectors (numpy.ndarray): Embeddings in the order of ``documents``.
+            dtype (str): "int8" (scalar-quantized) or "float16".
+            similarity (str): "cosine" (vectors are normalized first) or "dot_product".
+            version (str): Corpus version recorded for ``is_current``.
+        """
+        if dtype not in ("int8", "float16"):
+            raise ValueError(f"Unsupported dtype {dtype!r}, expected 'int8' or 'float16'")
+        os.makedirs(folder, exist_ok=True)
+        n, dim = len(documents), vectors.shape[1]
+        prep = _normalized if similarity == "cosine" else (lambda b: b)
+        scale = None
+        if dtype == "int8": # Symmetric per-dimension scale: the largest magnitude maps to 127
+            peak = np.zeros(dim, dtype=np.float32)
+            for i in range(0, n, block):
+                peak = np.maximum(peak, np.abs(prep(np.asarray(vectors[i:i + block], dtype=np.float32))).max(axis=0))
+            scale = np.where(peak > 0, peak / 127, 1.0).astype(np.float32)
+        codes = np.lib.format.open_memmap(os.path.join(folder, VECTORS_NAME + ".tmp.npy"), mode="w+",
+                                          dtype=np.int8 if dtype == "int8" else np.float16, shape=(n, dim))
+        for i in range(0, n, block):
+            chunk = prep(np.asarray(vectors[i:i + block], dtype=np.float32))
+            codes[i:i + block] = np.clip(np.rint(chunk / scale), -127, 127) if scale is not None else chunk
+        codes.flush()
+        del codes
+        offsets = np.empty(n + 1, dtype=np.int64)
+        offsets[0] = 0
+        with open(os.path.join(folder, BLOB_NAME + ".tmp"), "wb") as f: # One record at a time
+            for row, doc in enumerate(documents):
+                record = doc.to_dict() if hasattr(doc, "to_dict") else dict(doc)
+                record.pop("embedding", None)
+                record.pop("score", None)
+                data = json.dumps(record, ensure_ascii=False).encode("utf-8")
+                f.write(data)
+                offsets[row + 1] = offsets[row] + len(data)
+        np.save(os.path.join(folder, OFFSETS_NAME), offsets)
+        os.replace(os.path.join(folder, VECTORS_NAME + ".tmp.npy"), os.path.join(folder, VECTORS_NAME))
+        os.replace(os.path.join(folder, BLOB_NAME + ".tmp"), os.path.join(folder, BLOB_NAME))
+        with open(os.path.join(folder, META_NAME), "w", encoding="utf-8") as f: # Written last: marks the store complete
+            json.dump({"version": version, "dtype": dtype, "similarity": similarity, "count": n, "dim": dim,
+                       "scale": scale.tolist() if scale is not None else None}, f)
+
+    @staticmethod
+    def is_current(folder, version, dtype):
+        """True when ``folder`` holds a complete store of corpus ``version`` in ``dtype``."""
+        try:
+            with open(os.path.join(folder, META_NAME), "r", encoding="utf-8") as f:
+                info = json.load(f)
+        except (OSError, ValueError):
+            return False
+        return info.get("version") == version and info.get("dtype") == dtype
+
+    def get_document_count(self):
+        return len(self.codes)
+
+    def document(self, row):
+        """Decode the document stored at ``row``."""
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        return Document.from_dict(json.loads(self.blob[start:end].tobytes().decode("utf-8")))
+
+    def search(self, q_emb, top_k=10):
+        """
+        Return ``(rows, scores)`` of the ``top_k`` neighbours for each row of the (queries, dim) ``q_emb``.
+        """
+        q_emb = np.array(q_emb, dtype=np.float32, ndmin=2)
+        if self.similarity == "cosine":
+            q_emb = _normalized(q_emb)
+        weights = q_emb * self.scale if self.scale is not None else q_emb # Fold the int8 scales into the queries
+        n = len(self.codes)
+        candidates = max(top_k, self.rescore) if self.full_vectors is not None else top_k
+        k = min(candidates, n)
+        if k == 0:
+            return [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)) for _ in q_emb]
+        best_rows = np.empty((len(q_emb), 0), dtype=np.int64) # Running top-k per query, carried across blocks
+        best_scores = np.empty((len(q_emb), 0), dtype=np.float32)
+        for i in range(0, n, self.block): # Temporary memory is one (queries, block) score matrix
+            scores = weights @ np.asarray(self.codes[i:i + self.block], dtype=np.float32).T
+            kb = min(k, scores.shape[1])
+            top = np.argpartition(-scores, kb - 1, axis=1)[:, :kb]
+            best_rows = np.concatenate([best_rows, top + i], axis=1)
+            best_scores = np.concatenate([best_scores, np.take_along_axis(scores, top, axis=1)], axis=1)
+            if best_rows.shape[1] > k:
+                keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+        results = []
+        for query, rows, row_scores in zip(q_emb, best_rows, best_scores):
+            if self.full_vectors is not None: # Exact scores for the short list
+                rows = np.sort(rows) # Ascending rows read the memmap in order
+                full = np.asarray(self.full_vectors[rows], dtype=np.float32)
+                row_scores = (_normalized(full) if self.similarity == "cosine" else full) @ query
+            order = np.argsort(-row_scores)[:top_k]
+            results.append((rows[order], row_scores[order]))
+        return results
+
+
+class CompactRetriever(BaseComponent):
+    """Retriever node over a ``CompactVectorStore``; queries are embedded by the wrapped ``EmbeddingRetriever``."""
+
+    outgoing_edges = 1
+
+    def __init__(self, dense_retriever, store, top_k=5):
+        super().__init__()
+        self.dense = dense_retriever
+        self.document_store = store
+        self.top_k = top_k
+
+    def embed_queries(self, queries):
+        return self.dense.embed_queries(queries)
+
+    def retrieve_with_embeddings(self, queries, q_emb, top_k=None):
+        """Top-k documents for each query, given the precomputed query embeddings."""
+        results = []
+        for rows, scores in self.document_store.search(q_emb, top_k or self.top_k):
+            hits = []
+            for row, score in zip(rows, scores):
+                doc = self.document_store.document(int(row))
+                doc.score = _scale_score(float(score), self.document_store.similarity)
+                hits.append(doc)
+            results.append(hits)
+        return results
+
+    def run(self, query, top_k=None):
+        documents = self.retrieve_with_embeddings([query], self.embed_queries([query]), top_k)[0]
+        return {"documents": documents}, "output_1"
+
+    def run_batch(self, queries, top_k=None):
+        queries = [queries] if isinstance(queries, str) else queries
+        return {"documents": self.retrieve_with_embeddings(queries, self.embed_queries(queries), top_k)}, "output_1"
@@ -0,0 +1,186 @@
+# By Alexandros Panagiotakopoulos
+# Copyright (c) 2025 Alexandros Panagiotakopoulos. All rights reserved.
+# Date: 20/06/2025
+
+"""
+Near-duplicate detection for corpus documents with MinHash and LSH.
+
+Each document becomes a set of word k-shingles; ``num_perm`` random hash permutations
+turn it into a MinHash signature whose per-position agreement estimates the Jaccard
+similarity of two shingle sets. Signatures are cut into ``bands`` of ``rows`` values and
+documents that share any band land in the same bucket, so only those candidate pairs are
+compared. Pairs whose estimated similarity reaches the threshold are merged with a
+union-find, and each cluster collapses into one document before chunking and embedding.
+
+With a ``cache_path`` the clusters are stored next to a digest of the documents'
+content hashes and the parameters, so an unchanged corpus skips the MinHash pass.
+"""
+
+import os
+import re
+import json
+import zlib
+import hashlib
+import unicodedata
+
+import numpy as np
+
+from embedding_index import content_hash
+
+
+WORD = re.compile(r"\w+")
+PRIME = (1 << 31) - 1 # Mersenne prime; (a * x + b) stays below 2**62, so uint64 never overflows
+
+
+def shingles(text, k=5):
+    """Set of case-folded, accent-stripped word k-shingles, hashed to 32-bit integers."""
+    text = unicodedata.normalize("NFD", text.casefold())
+    words = WORD.findall("".join(ch for ch in text if not unicodedata.combining(ch)))
+    if len(words) <= k:
+        return {zlib.crc32(" ".join(words).encode("utf-8"))} if words else set()
+    return {zlib.crc32(" ".join(words[i:i + k]).encode("utf-8")) for i in range(len(words) - k + 1)}
+
+
+def lsh_params(num_perm, threshold):
+    """
+    The (bands, rows) split of ``num_perm`` with the highest S-curve midpoint (1/b)^(1/r)
+    not above ``threshold``: pairs at the threshold are still very likely to share a band,
+    and the false positives this admits are removed by the signature check.
+    """
+    options = [(num_perm // r, r) for r in range(1, num_perm + 1) if num_perm % r == 0]
+    below = [br for br in options if (1 / br[0]) ** (1 / br[1]) <= threshold]
+    return max(below or options[:1], key=lambda br: (1 / br[0]) ** (1 / br[1]))
+
+
+class MinHasher:
+    """Computes MinHash signatures with ``num_perm`` universal hash functions."""
+
+    def __init__(self, num_perm=128, seed=1):
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, PRIME, size=num_perm).astype(np.uint64)
+        self.b = rng.randint(0, PRIME, size=num_perm).astype(np.uint64)
+
+    def signature(self, hashes):
+        """MinHash signature (uint32 array) of a set of shingle hashes."""
+        x = np.fromiter(hashes, dtype=np.uint64, count=len(hashes)) % PRIME
+        return ((np.outer(x, self.a) + self.b) % PRIME).min(axis=0).astype(np.uint32)
+
+
+class UnionFind:
+    def __init__(self, n):
+        self.parent = list(range(n))
+
+    def find(self, i):
+        root = i
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[i] != root: # Path compression
+            self.parent[i], i = root, self.parent[i]
+        return root
+
+    def union(self, i, j):
+        ri, rj = self.find(i), self.find(j)
+        if ri != rj:
+            self.parent[max(ri, rj)] = min(ri, rj) # The earliest document is the root
+        return ri != rj
+
+
+def near_duplicate_clusters(texts, threshold=0.8, num_perm=128, k=5, seed=1):
+    """
+    Group ``texts`` into clusters of near-duplicates.
+
+    Args:
+        texts (list): Document texts.
+        threshold (float): Minimum estimated Jaccard similarity of the shingle sets.
+        num_perm (int): MinHash signature length.
+        k (int): Words per shingle.
+
+    Returns:
+        list: Clusters as lists of indices into ``texts``, ordered by first member; singletons included.
+    """
+    hasher = MinHasher(num_perm, seed)
+    bands, rows = lsh_params(num_perm, threshold)
+    signatures = [None] * len(texts)
+    buckets = {} # (band, band values) -> indices
+    for i, text in enumerate(texts):
+        hashes = shingles(text, k)
+        if not hashes:
+            continue
+        signatures[i] = sig = hasher.signature(hashes)
+        for band in range(bands):
+            buckets.setdefault((band, sig[band * rows:(band + 1) * rows].tobytes()), []).append(i)
+    uf = UnionFind(len(texts))
+    checked = set()
+    for members in buckets.values():
+        for j in members[1:]: # Chain the bucket to its first member; union-find makes it transitive
+            i = members[0]
+            if (i, j) in checked or uf.find(i) == uf.find(j):
+                continue
+            checked.add((i, j))
+            if np.mean(signatures[i] == signatures[j]) >= threshold: # Drop LSH false positives
+                uf.union(i, j)
+    clusters = {}
+    for i in range(len(texts)):
+        clusters.setdefault(uf.find(i), []).append(i)
+    return list(clusters.values())
+
+
+def cached_clusters(texts, cache_path, threshold=0.8, num_perm=128, k=5):
+    """
+    ``near_duplicate_clusters`` of ``texts``, reused from ``cache_path`` when the texts
+    (by content hash) and the parameters are unchanged.
+    """
+    digest = hashlib.sha1()
+    for text in texts:
+        digest.update(content_hash(text).encode("ascii"))
+    key = f"{digest.hexdigest()}:{threshold}:{num_perm}:{k}"
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+        if cached.get("key") == key:
+            return cached["clusters"]
+    except (OSError, ValueError):
+        pass
+    clusters = near_duplicate_clusters(texts, threshold, num_perm, k)
+    os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+    tmp_path = cache_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"key": key, "clusters": clusters}, f)
+    os.replace(tmp_path, cache_path)
+    return clusters
+
+
+def deduplicate(docs, threshold=0.8, num_perm=128, k=5, cache_path=None):
+    """
+    Collapse near-duplicate documents, keeping the longest one of each cluster.
+
+    The kept document takes the position of the cluster's first member. Its ``meta``
+    gains ``merged_sources`` (the filenames of the dropped copies) and the union of
+    their ``terms``.
+
+    Args:
+        docs (list): ``{"content", "meta"}`` dicts.
+        threshold (float): Minimum estimated Jaccard similarity to merge.
+        cache_path (str): Optional JSON file that keeps the clusters between runs.
+
+    Returns:
+        list: The deduplicated documents.
+    """
+    texts = [d["content"] for d in docs]
+    if cache_path:
+        clusters = cached_clusters(texts, cache_path, threshold, num_perm, k)
+    else:
+        clusters = near_duplicate_clusters(texts, threshold, num_perm, k)
+    result = []
+    for members in clusters:
+        keep = max(members, key=lambda i: (len(docs[i]["content"]), -i)) # Longest text; earliest on ties
+        doc = docs[keep]
+        if len(members) > 1:
+            meta = dict(doc["meta"])
+            dropped = [docs[i]["meta"] for i in members if i != keep]
+            meta["merged_sources"] = meta.get("merged_sources", []) + [m.get("filename") for m in dropped]
+            if "terms" in meta or any("terms" in m for m in dropped):
+                meta["terms"] = sorted(set(meta.get("terms", [])).union(*(m.get("terms", []) for m in dropped)))
+            doc = dict(doc, meta=meta)
+        result.append(doc)
+    return result
@@ -0,0 +1,139 @@
+# By Alexandros Panagiotakopoulos
+# Copyright (c) 2025 Alexandros Panagiotakopoulos. All rights reserved.
+# Date: 20/06/2025
+
+"""
+Persistent on-disk embedding index for the Biomedical RAG pipeline.
+
+The vectors live in a memory-mapped ``.npy`` array and a small JSON manifest maps
+the content hash of every document to its row. On startup only the documents whose
+content hash is not in the manifest are sent to the embedding model, so an unchanged
+corpus is loaded straight from disk instead of being re-embedded.
+"""
+
+import os
+import json
+import hashlib
+
+import numpy as np
+
+
+MANIFEST_NAME = "manifest.json"
+VECTORS_NAME = "vectors.npy"
+
+
+def content_hash(content):
+    """Return the SHA-1 hex digest of a document's text content."""
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+def _atomic_write_json(path, data):
+    tmp_path = path + ".tmp" # Write next to the target so the rename stays on the same filesystem
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path) # Atomic on both POSIX and Windows
+
+
+class EmbeddingIndex:
+    """Content-hash keyed store of document embeddings backed by a memory-mapped array."""
+
+    def __init__(self, index_dir, embedding_dim=384, model_name="", dtype="float32"):
+        """
+        Args:
+            index_dir (str): Folder that holds ``vectors.npy`` and ``manifest.json``.
+            embedding_dim (int): Dimension of the embedding vectors.
+            model_name (str): Embedding model name, with a precision suffix such as ":int8" for a
+                quantized model; a different value invalidates the index.
+            dtype (str): Storage dtype of the vectors ("float32" or "float16").
+        """
+        self.index_dir = index_dir
+        self.embedding_dim = embedding_dim
+        self.model_name = model_name
+        self.dtype = np.dtype(dtype)
+        self.manifest_path = os.path.join(index_dir, MANIFEST_NAME)
+        self.vectors_path = os.path.join(index_dir, VECTORS_NAME)
+        self.hashes = [] # Content hash of each row, in row order
+        self.rows = {} # Content hash -> row number
+        self.vectors = None # Memory-mapped (rows, embedding_dim) array
+        self.load()
+
+    def load(self):
+        """Load the manifest and memory-map the vectors, discarding an incompatible index."""
+        if not (os.path.exists(self.manifest_path) and os.path.exists(self.vectors_path)):
+            return
+        with open(self.manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if (manifest.get("embedding_dim") != self.embedding_dim
+                or manifest.get("model_name") != self.model_name
+                or manifest.get("dtype") != self.dtype.name):
+            print("[Embedding index] Model or dimension changed, index will be rebuilt.")
+            return
+        vectors = np.load(self.vectors_path, mmap_mode="r") # Nothing is read until rows are touched
+        if vectors.shape != (len(manifest["hashes"]), self.embedding_dim):
+            print("[Embedding index] Manifest does not match vectors, index will be rebuilt.")
+            return
+        self.hashes = manifest["hashes"]
+        self.rows = {h: row for row, h in enumerate(self.hashes)}
+        self.vectors = vectors
+
+    @property
+    def version(self):
+        """A short digest of the indexed contents; changes whenever any document or the model changes."""
+        return hashlib.sha1((self.model_name + "\0" + "".join(self.hashes)).encode("utf-8")).hexdigest()[:16]
+
+    def sync(self, documents, embed_fn):
+        """
+        Return the embeddings of ``documents`` in order, embedding only new content.
+
+        Args:
+            documents (list): Haystack ``Document`` objects (anything with a ``content`` attribute).
+            embed_fn (callable): Takes a list of documents and returns an (n, dim) array,
+                e.g. ``EmbeddingRetriever.embed_documents``. An ``EmbeddingStage`` is used
+                through its ``embed_into``, which streams the vectors into the index file.
+
+        Returns:
+            numpy.ndarray: Memory-mapped (len(documents), embedding_dim) array.
+        """
+        hashes = [content_hash(doc.content) for doc in documents]
+        if hashes == self.hashes and self.vectors is not None: # Unchanged corpus: nothing to embed or rewrite
+            print(f"[Embedding index] Loaded {len(hashes)} cached embeddings.")
+            return self.vectors
+
+        missing = {} # Content hash -> (first document with that content, its row)
+        for row, (doc, h) in enumerate(zip(documents, hashes)):
+            if h not in self.rows and h not in missing:
+                missing[h] = (doc, row)
+        cached = sum(1 for h in hashes if h in self.rows)
+        print(f"[Embedding index] {cached} cached, {len(missing)} to embed.")
+
+        os.makedirs(self.index_dir, exist_ok=True)
+        tmp_path = self.vectors_path + ".tmp.npy"
+        out = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=self.dtype,
+                                        shape=(len(hashes), self.embedding_dim))
+        for row, h in enumerate(hashes): # Stale rows are simply not copied over
+            if h in self.rows:
+                out[row] = self.vectors[self.rows[h]]
+        if missing:
+            new_docs = [doc for doc, _ in missing.values()]
+            new_rows = [row for _, row in missing.values()]
+            if hasattr(embed_fn, "embed_into"): # embedding_stage.EmbeddingStage writes each batch straight into the memmap
+                embed_fn.embed_into([doc.content for doc in new_docs], out, new_rows)
+            else:
+                out[new_rows] = np.asarray(embed_fn(new_docs), dtype=self.dtype)
+            for row, h in enumerate(hashes): # Repeated new content is embedded once
+                if h in missing and missing[h][1] != row:
+                    out[row] = out[missing[h][1]]
+        out.flush()
+        del out
+        self.vectors = None # Release the old mapping before replacing the file (required on Windows)
+        os.replace(tmp_path, self.vectors_path)
+        _atomic_write_json(self.manifest_path, {
+            "embedding_dim": self.embedding_dim,
+            "model_name": self.model_name,
+            "dtype": self.dtype.name,
+            "hashes": hashes,
+        })
+        self.hashes = hashes
+        self.rows = {h: row for row, h in enumerate(hashes)}
+        self.vectors = np.load(self.vectors_path, mmap_mode="r")
+        return self.vectors
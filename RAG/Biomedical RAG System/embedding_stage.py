@@ -0,0 +1,150 @@
+# By Alexandros Panagiotakopoulos
+# Copyright (c) 2025 Alexandros Panagiotakopoulos. All rights reserved.
+# Date: 20/06/2025
+
+"""
+Offline corpus embedding: length-sorted, memory-budgeted batches, optionally sharded
+across CPU worker processes, streamed into a preallocated array.
+
+Texts are ordered by token length, so every batch holds texts of similar length and
+little compute is spent on padding. Batches are not a fixed size: each one grows until
+the estimated activation memory of a (batch, padded length) forward pass would exceed
+``memory_budget_mb``, so batches of short texts are large and batches of long ones are
+small. The longest batches run first, so an undersized budget fails immediately.
+
+On CPU the batches are spread over ``workers`` processes, each with its own copy of the
+sentence-transformers model and ``torch_threads`` intra-op threads. Finished batches are
+written straight into their rows of the output array (e.g. the embedding index memmap,
+in float16 or float32), so the full float32 result is never held in memory.
+"""
+
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from chunking import TOKEN
+
+
+TOKEN_BYTES = 384 * 4 * 16 # Activations per token and layer for a MiniLM-sized encoder (hidden 384, fp32, ~16 live tensors)
+ATTENTION_BYTES = 12 * 4 # Attention scores per token pair (12 heads, fp32)
+
+_worker_model = None
+
+
+def _init_worker(model_name, torch_threads, quantize):
+    global _worker_model
+    import torch
+    from sentence_transformers import SentenceTransformer
+    torch.set_num_threads(torch_threads) # Workers x threads should not exceed the cores
+    model = SentenceTransformer(model_name, device="cpu")
+    if quantize:
+        from quantization import quantize_module
+        model = quantize_module(model)
+    _worker_model = model
+
+
+def _encode_batch(rows, texts):
+    return rows, _worker_model.encode(texts, batch_size=len(texts), convert_to_numpy=True, show_progress_bar=False)
+
+
+class EmbeddingStage:
+    """Embeds many texts with a sentence-transformers model (see module docstring)."""
+
+    def __init__(self, model_name, embedding_dim=384, model=None, workers=1, torch_threads=None, memory_budget_mb=512,
+                 max_batch_size=256, max_seq_length=128, quantize=False):
+        """
+        Args:
+            model_name (str): sentence-transformers model name (loaded by each worker process).
+            embedding_dim (int): Dimension of the embedding vectors.
+            model: An already loaded ``SentenceTransformer`` for in-process embedding (GPU,
+                or ``workers=1``); e.g. the retriever's ``embedding_encoder.embedding_model``.
+            workers (int): CPU worker processes; 1 embeds in this process.
+            torch_threads (int): Intra-op threads per worker (default: cores / workers).
+            memory_budget_mb (float): Estimated activation memory allowed per batch.
+            max_batch_size (int): Upper bound on texts per batch.
+            max_seq_length (int): Model truncation length in tokens.
+            quantize (bool): int8-quantize the worker models (match ``SERVING_MODE = "cpu-int8"``).
+        """
+        self.model_name = model_name
+        self.embedding_dim = embedding_dim
+        self.model = model
+        self.workers = max(1, workers)
+        self.torch_threads = torch_threads or max(1, (os.cpu_count() or 1) // self.workers)
+        self.memory_budget = memory_budget_mb * 2**20
+        self.max_batch_size = max_batch_size
+        self.max_seq_length = getattr(model, "max_seq_length", None) or max_seq_length
+        self.quantize = quantize
+
+    def token_lengths(self, texts):
+        """Token counts (with special tokens, truncated), from the model's tokenizer when it is loaded."""
+        tokenizer = getattr(self.model, "tokenizer", None)
+        if tokenizer is not None:
+            lengths = [len(ids) for ids in tokenizer(texts, add_special_tokens=True)["input_ids"]]
+        else: # Workers hold the models; words and punctuation approximate subword counts
+            lengths = [len(TOKEN.findall(text)) + 2 for text in texts]
+        return [min(n, self.max_seq_length) for n in lengths]
+
+    def batch_cost(self, size, length):
+        """Estimated activation bytes of one forward pass over ``size`` texts padded to ``length`` tokens."""
+        return size * length * (TOKEN_BYTES + ATTENTION_BYTES * length)
+
+    def batches(self, texts):
+        """
+        Split ``texts`` into length-sorted batches that fit the memory budget.
+
+        Returns:
+            list: Arrays of row indices into ``texts``, longest batch first.
+        """
+        lengths = self.token_lengths(texts)
+        order = sorted(range(len(texts)), key=lambda i: -lengths[i])
+        batches, current = [], []
+        for i in order:
+            padded = lengths[current[0]] if current else lengths[i] # Sorted descending: the first text sets the padding
+            if current and (len(current) >= self.max_batch_size or self.batch_cost(len(current) + 1, padded) > self.memory_budget):
+                batches.append(np.array(current))
+                current = []
+            current.append(i)
+        if current:
+            batches.append(np.array(current))
+        return batches
+
+    def embed_into(self, texts, out, rows=None):
+        """
+        Embed ``texts`` and write each vector into ``out[rows[i]]``.
+
+        Args:
+            texts (list): Texts to embed.
+            out (numpy.ndarray): Preallocated (n, dim) array (or memmap); cast to its dtype.
+            rows (list): Target row of each text (default: 0..len(texts)-1).
+        """
+        rows = np.arange(len(texts)) if rows is None else np.asarray(rows)
+        batches = self.batches(texts)
+        start = time.perf_counter()
+        if self.workers == 1:
+            model = self.model
+            if model is None:
+                from sentence_transformers import SentenceTransformer
+                model = self.model = SentenceTransformer(self.model_name)
+            for batch in batches:
+                out[rows[batch]] = model.encode([texts[i] for i in batch], batch_size=len(batch),
+                                                convert_to_numpy=True, show_progress_bar=False)
+        else:
+            context = multiprocessing.get_context("spawn") # Forking a process that already runs torch threads can deadlock
+            with ProcessPoolExecutor(max_workers=self.workers, mp_context=context, initializer=_init_worker,
+                                     initargs=(self.model_name, self.torch_threads, self.quantize)) as pool:
+                futures = [pool.submit(_encode_batch, batch, [texts[i] for i in batch]) for batch in batches]
+                for future in as_completed(futures): # Written as they finish, in any order
+                    batch, vectors = future.result()
+                    out[rows[batch]] = vectors
+        elapsed = time.perf_counter() - start
+        print(f"[Embedding] {len(texts)} texts in {len(batches)} batches, {self.workers} worker(s): "
+              f"{len(texts) / elapsed if elapsed else 0:.1f} texts/s")
+        return out
+
+    def __call__(self, documents):
+        """``embed_fn`` protocol of ``EmbeddingIndex.sync``: documents -> (n, dim) float32 array."""
+        texts = [doc.content for doc in documents]
+        return self.embed_into(texts, np.empty((len(texts), self.embedding_dim), dtype=np.float32))
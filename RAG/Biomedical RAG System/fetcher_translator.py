@@ -2,66 +2,168 @@
 # Copyright (c) 2025 Alexandros Panagiotakopoulos. All rights reserved.
 # Date: 20/06/2025
 
-from deep_translator import GoogleTranslator
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
 import time
 
+from chunking import split_chunks
+
 INPUT_FILE = "C:/Users/alexa/Desktop/assignment_corpus/translation_english_to_greek/english_terms_fetched_not_translated.txt"
 OUTPUT_FILE = "C:/Users/alexa/Desktop/assignment_corpus/translation_english_to_greek/successful_fetched_translation.txt"
+CHECKPOINT_FILE = OUTPUT_FILE + ".checkpoint.jsonl" # Append-only log of finished blocks
+
+CONCURRENCY = 4 # Translation requests in flight at once
+RATE_LIMIT = 0.5 # Allowed requests per second, averaged
+BURST = 2 # Requests that may be sent back to back before the rate limit applies
+
+class TokenBucket:
+    # Thread-safe token bucket: acquire() blocks until a request may be sent
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait) # Sleep outside the lock so other workers can refill-check
+
+class StubTranslator:
+    # Local stand-in for GoogleTranslator, for tests and dry runs without network access
+    def __init__(self, source='en', target='el', latency=0.0):
+        self.target = target
+        self.latency = latency
+
+    def translate(self, text):
+        time.sleep(self.latency)
+        return f"[{self.target}] {text}"
+
+def make_translator(stub=False):
+    if stub:
+        return StubTranslator(source='en', target='el')
+    from deep_translator import GoogleTranslator # Only needed for real runs
+    return GoogleTranslator(source='en', target='el')
 
 def split_text(text, max_chars=5000):
-    # Split by paragraphs, then by sentences, then by chars if needed
-    import re
-    blocks = []
-    for paragraph in text.split("\n\n"):
-        sentences = re.split(r'(?<=[.!?])\s+', paragraph)
-        current = ""
-        for sentence in sentences:
-            if len(current) + len(sentence) + 1 <= max_chars:
-                current += " " + sentence if current else sentence
-            else:
-                if current:
-                    blocks.append(current.strip())
-                current = sentence
-        if current:
-            blocks.append(current.strip())
-    # If any block is still too big, split by chars
-    final_blocks = []
-    for block in blocks:
-        if len(block) > max_chars:
-            for i in range(0, len(block), max_chars):
-                final_blocks.append(block[i:i+max_chars])
-        else:
-            final_blocks.append(block)
-    return final_blocks
-
-def translate_block(text, retries=3, delay=3):
+    # Sentence-aware chunks computed as offsets in one regex pass (see chunking.py)
+    return split_chunks(text, max_chars)
+
+def translate_chunk(chunk, bucket=None, retries=3, delay=3, stub=False):
+    # One rate-limited request with exponential backoff (delay, 2*delay, 4*delay, ... plus jitter)
+    for attempt in range(retries):
+        if bucket is not None:
+            bucket.acquire()
+        try:
+            return make_translator(stub).translate(chunk)
+        except Exception as e:
+            if "Text length need to be between 0 and 5000 characters" in str(e):
+                print(f"[Translation error] Chunk too long: {len(chunk)}. Skipping chunk.")
+                return chunk
+            backoff = delay * (2 ** attempt) + random.uniform(0, delay)
+            print(f"[Translation error] {e}. Retrying {attempt+1}/{retries} in {backoff:.1f}s...")
+            time.sleep(backoff)
+    print("[Translation error] Failed after retries. Returning original text.")
+    return chunk
+
+def translate_block(text, bucket=None, retries=3, delay=3, stub=False):
     translations = []
-    for chunk in split_text(text):
-        for attempt in range(retries):
-            try:
-                return GoogleTranslator(source='en', target='el').translate(chunk)
-            except Exception as e:
-                if "Text length need to be between 0 and 5000 characters" in str(e):
-                    print(f"[Translation error] Chunk too long: {len(chunk)}. Skipping chunk.")
-                    return chunk
-                print(f"[Translation error] {e}. Retrying {attempt+1}/{retries}...")
-                time.sleep(delay)
-        print("[Translation error] Failed after retries. Returning original text.")
-        return chunk
-
-def main():
+    for chunk in split_text(text): # Every chunk is translated, not just the first one
+        translations.append(translate_chunk(chunk, bucket, retries, delay, stub))
+    return "\n".join(translations)
+
+class CheckpointLog:
+    # Append-only JSON-lines log of finished blocks, so a killed run resumes where it stopped
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.done = {} # Block index -> (source hash, translation)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError: # A line cut short by the crash; that block is redone
+                        continue
+                    self.done[entry["idx"]] = (entry["sha1"], entry["translation"])
+            with open(path, "rb+") as f: # Terminate a torn last line so new entries start on their own line
+                f.seek(0, os.SEEK_END)
+                if f.tell():
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        f.write(b"\n")
+
+    def get(self, idx, block):
+        entry = self.done.get(idx)
+        if entry and entry[0] == block_hash(block): # Ignore entries for a different input file
+            return entry[1]
+        return None
+
+    def append(self, idx, block, translation):
+        line = json.dumps({"idx": idx, "sha1": block_hash(block), "translation": translation}, ensure_ascii=False)
+        with self.lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+                f.flush()
+                os.fsync(f.fileno()) # On disk before the block counts as done
+
+def block_hash(block):
+    return hashlib.sha1(block.encode("utf-8")).hexdigest()
+
+def write_atomic(path, text):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path) # Readers see either the old file or the complete new one
+
+def main(concurrency=CONCURRENCY, rate=RATE_LIMIT, burst=BURST, stub=False):
     with open(INPUT_FILE, "r", encoding="utf-8") as f:
         content = f.read()
     english_blocks = [block.strip() for block in content.split("\n\n") if block.strip()]
-    translations = []
-    for idx, block in enumerate(english_blocks, 1):
-        print(f"Translating block {idx}/{len(english_blocks)}...")
-        translation = translate_block(block)
-        translations.append(translation)
-        time.sleep(2)
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        f.write("\n\n".join(translations))
+    bucket = TokenBucket(rate, burst) # Shared by all workers, so the total request rate is capped
+    checkpoint = CheckpointLog(CHECKPOINT_FILE)
+    total = len(english_blocks)
+    resumed = sum(1 for idx, block in enumerate(english_blocks, 1) if checkpoint.get(idx, block) is not None)
+    if resumed:
+        print(f"Resuming: {resumed}/{total} blocks already translated.")
+
+    def work(item):
+        idx, block = item
+        translation = checkpoint.get(idx, block)
+        if translation is not None:
+            return translation
+        print(f"Translating block {idx}/{total}...")
+        translation = translate_block(block, bucket, stub=stub)
+        checkpoint.append(idx, block, translation)
+        return translation
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        translations = list(pool.map(work, enumerate(english_blocks, 1))) # map() keeps the input order
+    write_atomic(OUTPUT_FILE, "\n\n".join(translations))
+    if os.path.exists(CHECKPOINT_FILE): # Not created when no block needed translating (e.g. an empty input file)
+        os.remove(CHECKPOINT_FILE) # The output is complete, the log is no longer needed
     print(f"All translations saved to {OUTPUT_FILE}")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Translate the collected English blocks to Greek.")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="parallel translation requests")
+    parser.add_argument("--rate", type=float, default=RATE_LIMIT, help="requests per second")
+    parser.add_argument("--burst", type=int, default=BURST, help="token bucket capacity")
+    parser.add_argument("--stub", action="store_true", help="use the local stub translator (no network)")
+    args = parser.parse_args()
+    main(args.concurrency, args.rate, args.burst, args.stub)
@@ -0,0 +1,182 @@
+# By Alexandros Panagiotakopoulos
+# Copyright (c) 2025 Alexandros Panagiotakopoulos. All rights reserved.
+# Date: 20/06/2025
+
+"""
+Language-partitioned dense retrieval for Greek and English questions.
+
+``detect_language`` decides between Greek and English from Unicode script ranges
+(Greek and Coptic U+0370-03FF, Greek Extended U+1F00-1FFF, against Latin letters), which
+costs one regex pass over the question. ``LanguageRouter`` splits the document
+embeddings into one matrix per ``meta["lang"]`` and scores a question against its own
+language's matrix only. When the best cosine similarity there is below ``min_score``, the
+remaining partitions are searched as well and the results merged (cross-lingual
+fallback), so questions answered only by documents in the other language still work.
+
+With ``mode="rrf"`` or ``"prefilter"`` every partition also gets its own ``BM25Index``
+and is searched like ``bm25.HybridRetriever``, so the default hybrid pipeline is routed
+too; the fallback still looks at the best cosine similarity of the partition.
+
+The partition matrices hold L2-normalized rows plus their norms, so the fallback check is
+always a cosine, whatever the store's ``similarity``: the default ``InMemoryDocumentStore``
+ranks by dot product, and the multilingual MiniLM vectors are not normalized. Dot-product
+scores are recovered as cosine x row norm x query norm from the same matrix multiply.
+"""
+
+import re
+import copy
+
+import numpy as np
+
+from haystack.nodes.base import BaseComponent
+
+from bm25 import BM25Index, hybrid_rank
+
+
+GREEK = re.compile(r"[\u0370-\u03ff\u1f00-\u1fff]") # Greek and Coptic, Greek Extended (polytonic)
+LATIN = re.compile(r"[A-Za-z\u00c0-\u024f]") # Basic Latin and the accented Latin blocks
+
+
+def detect_language(text, min_letters=3):
+    """
+    Return "el" or "en" by the majority script of the letters in ``text``.
+
+    Returns None when the text has fewer than ``min_letters`` Greek or Latin letters.
+    Acronyms inside a Greek question ("Τι είναι η CAR-T θεραπεία;") do not outweigh the Greek words.
+    """
+    greek = len(GREEK.findall(text))
+    latin = len(LATIN.findall(text))
+    if greek + latin < min_letters:
+        return None
+    return "el" if greek >= latin else "en"
+
+
+class LanguageRouter(BaseComponent):
+    """Dense or hybrid retrieval node that searches the question's language partition first."""
+
+    outgoing_edges = 1
+
+    def __init__(self, dense_retriever, top_k=5, min_score=0.5, mode="dense", candidates=100, rrf_k=60):
+        """
+        Args:
+            dense_retriever: The ``EmbeddingRetriever``; its document store is partitioned.
+            top_k (int): Documents returned by default.
+            min_score (float): Cosine similarity the best same-language document needs
+                (for any store ``similarity``); below it all partitions are searched.
+            mode (str): "dense", or "rrf" / "prefilter" for hybrid search (see ``bm25.HybridRetriever``).
+            candidates (int): Hybrid modes: ranking length before fusion.
+            rrf_k (int): Hybrid modes: reciprocal rank fusion constant.
+        """
+        super().__init__()
+        self.dense = dense_retriever
+        self.document_store = dense_retriever.document_store
+        self.top_k = top_k
+        self.min_score = min_score
+        self.mode = mode
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+        self._partitions = None # (store counts, {lang: (documents, unit matrix, row norms, BM25Index or None)})
+        self.stats = {"routed": 0, "fallback": 0, "unrouted": 0}
+
+    def embed_queries(self, queries):
+        return self.dense.embed_queries(queries)
+
+    def partitions(self):
+        """{lang: (documents, (n, dim) unit-norm matrix, (n,) row norms, BM25Index or None)}, rebuilt when the store's counts change."""
+        store = self.document_store
+        key = (store.get_document_count(), store.get_embedding_count())
+        if self._partitions is None or self._partitions[0] != key:
+            grouped = {}
+            for d in store.get_all_documents(return_embedding=True):
+                if d.embedding is not None:
+                    grouped.setdefault(d.meta.get("lang"), []).append(d)
+            parts = {}
+            for lang, docs in grouped.items():
+                matrix = np.stack([d.embedding for d in docs]).astype(np.float32) # One contiguous matrix per language
+                norms = np.linalg.norm(matrix, axis=1) + 1e-12
+                matrix /= norms[:, None]
+                light = []
+                for d in docs: # The matrices hold the vectors
+                    d = copy.copy(d)
+                    d.embedding = None
+                    light.append(d)
+                bm25 = BM25Index([d.content for d in docs]) if self.mode != "dense" else None
+                parts[lang] = (light, matrix, norms, bm25)
+            self._partitions = (key, parts)
+        return self._partitions[1]
+
+    def _search(self, part, queries, q_unit, q_norms, top_k):
+        """
+        Per query row: ``(hits, best_cosine)`` with ``(score, row)`` hits of one partition, best
+        first, and the best cosine similarity (None when the partition is empty).
+        """
+        docs, matrix, norms, bm25 = part
+        if not len(docs):
+            return [([], None) for _ in q_unit]
+        cosine = q_unit @ matrix.T
+        best = cosine.max(axis=1)
+        if self.document_store.similarity == "cosine":
+            scores = cosine
+        else: # Dot product, as the store ranks
+            scores = cosine * norms[None, :] * q_norms[:, None]
+        if bm25 is not None:
+            results = []
+            for query, emb, row_scores, best_cosine in zip(queries, q_unit, scores, best):
+                ranked, _ = hybrid_rank(query, emb, matrix, bm25, top_k, self.mode, self.candidates, self.rrf_k, scores=row_scores)
+                results.append(([(score, row) for row, score in ranked], float(best_cosine)))
+            return results
+        k = min(top_k, len(docs))
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for row_scores, rows, best_cosine in zip(scores, top, best):
+            rows = rows[np.argsort(-row_scores[rows])]
+            results.append(([(float(row_scores[r]), int(r)) for r in rows], float(best_cosine)))
+        return results
+
+    def retrieve_with_embeddings(self, queries, q_emb, top_k=None):
+        """Top-k documents for each query, routed by the query's language."""
+        top_k = top_k or self.top_k
+        store = self.document_store
+        parts = self.partitions()
+        q_emb = np.array(q_emb, dtype=np.float32, ndmin=2)
+        q_norms = np.linalg.norm(q_emb, axis=1) + 1e-12
+        q_unit = q_emb / q_norms[:, None]
+        candidates = [[] for _ in queries] # Per query: (score, lang, row)
+        searched = [set() for _ in queries]
+        groups = {} # Detected language -> query positions; each group is one matrix multiply
+        for i, query in enumerate(queries):
+            lang = detect_language(query)
+            groups.setdefault(lang if lang in parts else None, []).append(i)
+        fallback = groups.pop(None, [])
+        self.stats["unrouted"] += len(fallback)
+        for lang, positions in groups.items():
+            self.stats["routed"] += len(positions)
+            for i, (hits, best_cosine) in zip(positions, self._search(parts[lang], [queries[i] for i in positions], q_unit[positions], q_norms[positions], top_k)):
+                candidates[i] = [(score, lang, row) for score, row in hits]
+                searched[i].add(lang)
+                if best_cosine is None or best_cosine < self.min_score: # Weak same-language match: go cross-lingual
+                    self.stats["fallback"] += 1
+                    fallback.append(i)
+        for lang, part in parts.items(): # Cross-lingual: the partitions not yet searched by these queries
+            positions = [i for i in fallback if lang not in searched[i]]
+            if not positions:
+                continue
+            for i, (hits, _) in zip(positions, self._search(part, [queries[i] for i in positions], q_unit[positions], q_norms[positions], top_k)):
+                candidates[i] += [(score, lang, row) for score, row in hits]
+        results = []
+        for hits in candidates:
+            docs = []
+            for score, lang, row in sorted(hits, key=lambda h: -h[0])[:top_k]:
+                doc = copy.copy(parts[lang][0][row])
+                doc.score = score if self.mode != "dense" else store.scale_to_unit_interval(score, store.similarity) # Fused RRF score, as HybridRetriever reports
+                docs.append(doc)
+            results.append(docs)
+        return results
+
+    def run(self, query, top_k=None):
+        documents = self.retrieve_with_embeddings([query], self.embed_queries([query]), top_k)[0]
+        return {"documents": documents}, "output_1"
+
+    def run_batch(self, queries, top_k=None):
+        queries = [queries] if isinstance(queries, str) else queries
+        return {"documents": self.retrieve_with_embeddings(queries, self.embed_queries(queries), top_k)}, "output_1"
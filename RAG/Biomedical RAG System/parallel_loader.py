@@ -0,0 +1,70 @@
+# By Alexandros Panagiotakopoulos
+# Copyright (c) 2025 Alexandros Panagiotakopoulos. All rights reserved.
+# Date: 20/06/2025
+
+"""
+Parallel document loading across corpus sources.
+
+File reads are I/O bound (especially on a network filesystem), so they are fanned out
+to a thread pool where the waits overlap. Term filtering is CPU bound and holds the GIL,
+so for large folders it is sent to a process pool instead. Results are always returned
+in input order, which keeps the document list deterministic from run to run.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from term_matcher import matched_terms
+
+
+class ParallelLoader:
+    """Thread pool for reads plus an optional process pool for term filtering."""
+
+    def __init__(self, io_workers=16, filter_workers=None, process_threshold=2000):
+        """
+        Args:
+            io_workers (int): Threads used for listing folders and reading files.
+            filter_workers (int): Processes used for term filtering (default: CPU count).
+            process_threshold (int): Folders with at least this many files are filtered
+                in the process pool; smaller ones are filtered in the reading thread.
+        """
+        self.io_pool = ThreadPoolExecutor(max_workers=io_workers)
+        self.filter_workers = filter_workers or os.cpu_count() or 1
+        self.process_threshold = process_threshold
+        self._proc_pool = None # Started on first use, so small corpora never pay for it
+        self._proc_lock = threading.Lock() # Reader threads race to start the pool
+
+    def map(self, fn, items):
+        """Run ``fn`` over ``items`` on the thread pool and return the results in order."""
+        return list(self.io_pool.map(fn, items))
+
+    def use_processes(self, file_count):
+        """Whether a folder of ``file_count`` files should be filtered in the process pool."""
+        return self.filter_workers > 1 and file_count >= self.process_threshold
+
+    def find_terms(self, text, terms):
+        """Return the distinct ``terms`` in ``text``, computed in a worker process."""
+        if self._proc_pool is None:
+            with self._proc_lock:
+                if self._proc_pool is None: # Another thread may have started it while we waited
+                    self._proc_pool = ProcessPoolExecutor(max_workers=self.filter_workers)
+        return self._proc_pool.submit(matched_terms, text, tuple(terms)).result()
+
+    def close(self):
+        self.io_pool.shutdown()
+        if self._proc_pool is not None: # Readers have finished by now
+            self._proc_pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def list_files(folder, suffix):
+    """Sorted names of the files in ``folder`` ending with ``suffix`` ([] if it does not exist)."""
+    if not folder or not os.path.isdir(folder):
+        return []
+    return sorted(name for name in os.listdir(folder) if name.endswith(suffix))
@@ -0,0 +1,181 @@
+# By Alexandros Panagiotakopoulos
+# Copyright (c) 2025 Alexandros Panagiotakopoulos. All rights reserved.
+# Date: 20/06/2025
+
+"""
+Stage-level profiling for the RAG pipeline, switched on with the ``RAG_PROFILE`` environment variable.
+
+    RAG_PROFILE=1 python RAG.py rag
+
+Every instrumented stage (document loading, chunking, embedding, retrieval, generation)
+records its wall time, item count and resident-memory delta. Each call is written as one
+JSON line to ``RAG_PROFILE_LOG`` (stderr when unset), the per-stage totals are printed at
+exit, and ``prometheus_text()`` renders them for the query server's ``/metrics`` endpoint.
+
+When ``RAG_PROFILE`` is unset, ``profiled`` returns the function unchanged and ``stage``
+returns a shared no-op context manager, so the hooks cost next to nothing.
+"""
+
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+import functools
+from contextlib import nullcontext
+
+try:
+    import resource # Not available on Windows
+except ImportError:
+    resource = None
+
+
+ENABLED = os.environ.get("RAG_PROFILE", "").lower() not in ("", "0", "false", "no")
+LOG_PATH = os.environ.get("RAG_PROFILE_LOG")
+
+_NOOP = nullcontext()
+_stats = {} # stage -> {"calls", "seconds", "items", "rss_delta_bytes", "max_seconds"}
+_lock = threading.Lock()
+_log_file = None
+
+
+def rss_bytes():
+    """Current resident set size (peak RSS where /proc is unavailable, None on Windows)."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        if resource is None:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024 # bytes on macOS, KiB elsewhere
+
+
+def _emit(event):
+    global _log_file
+    line = json.dumps(event, ensure_ascii=False)
+    with _lock:
+        if LOG_PATH:
+            if _log_file is None:
+                _log_file = open(LOG_PATH, "a", encoding="utf-8")
+            _log_file.write(line + "\n")
+            _log_file.flush()
+        else:
+            print(line, file=sys.stderr)
+
+
+def record(name, seconds, items=None, rss_delta=None):
+    """Add one measurement of stage ``name`` and log it."""
+    with _lock:
+        s = _stats.setdefault(name, {"calls": 0, "seconds": 0.0, "items": 0, "rss_delta_bytes": 0, "max_seconds": 0.0})
+        s["calls"] += 1
+        s["seconds"] += seconds
+        s["max_seconds"] = max(s["max_seconds"], seconds)
+        s["items"] += items or 0
+        s["rss_delta_bytes"] += rss_delta or 0
+    _emit({"stage": name, "ts": time.time(), "seconds": seconds, "items": items, "rss_delta_bytes": rss_delta})
+
+
+class _Stage:
+    __slots__ = ("name", "items", "start", "rss")
+
+    def __init__(self, name, items):
+        self.name = name
+        self.items = items
+
+    def __enter__(self):
+        self.rss = rss_bytes()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        rss = rss_bytes()
+        record(self.name, seconds, self.items, rss - self.rss if rss is not None and self.rss is not None else None)
+        return False
+
+
+def stage(name, items=None):
+    """
+    Context manager timing the enclosed block as stage ``name``.
+
+    Args:
+        name (str): Stage name, e.g. "embedding".
+        items (int): Items processed in the block (documents, queries, prompts). The
+            returned object's ``items`` can also be set inside the block.
+    """
+    return _Stage(name, items) if ENABLED else _NOOP
+
+
+def profiled(name, count=None):
+    """
+    Decorator timing every call of the function as stage ``name``.
+
+    Args:
+        name (str): Stage name.
+        count (callable): ``count(result)`` -> item count, e.g. ``len``.
+    """
+    def decorate(fn):
+        if not ENABLED:
+            return fn # No wrapper at all when profiling is off
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _Stage(name, None) as s:
+                result = fn(*args, **kwargs)
+                s.items = count(result) if count else None
+            return result
+        return wrapper
+    return decorate
+
+
+def instrument_node(node, name):
+    """Time a haystack node's ``run`` and ``run_batch`` (used by ``pipe.run``) as stage ``name``."""
+    if not ENABLED:
+        return node
+    for method in ("run", "run_batch"):
+        fn = getattr(node, method, None)
+        if fn is not None:
+            setattr(node, method, profiled(name, count=_count_documents)(fn)) # functools.wraps keeps the signature haystack inspects
+    return node
+
+
+def _count_documents(result):
+    output = result[0] if isinstance(result, tuple) else result
+    docs = output.get("documents") if isinstance(output, dict) else None
+    return len(docs) if isinstance(docs, list) else None
+
+
+def summary():
+    """Per-stage totals: {stage: {"calls", "seconds", "items", "rss_delta_bytes", "max_seconds"}}."""
+    with _lock:
+        return {name: dict(s) for name, s in _stats.items()}
+
+
+def prometheus_text(prefix="rag_stage"):
+    """The per-stage totals in Prometheus text exposition format."""
+    lines = []
+    metrics = [("calls", "counter", "calls_total"), ("seconds", "counter", "seconds_total"),
+               ("items", "counter", "items_total"), ("rss_delta_bytes", "counter", "rss_delta_bytes_total"),
+               ("max_seconds", "gauge", "max_seconds")]
+    stats = summary()
+    for key, kind, metric in metrics:
+        lines.append(f"# TYPE {prefix}_{metric} {kind}")
+        for name, s in stats.items():
+            lines.append(f'{prefix}_{metric}{{stage="{name}"}} {s[key]}')
+    return "\n".join(lines) + "\n"
+
+
+def _report():
+    stats = summary()
+    if not stats:
+        return
+    print("[Profile] stage                     calls   total_s     max_s      items   rss_delta_MB", file=sys.stderr)
+    for name, s in sorted(stats.items(), key=lambda item: -item[1]["seconds"]):
+        print(f"[Profile] {name:24s} {s['calls']:6d} {s['seconds']:9.3f} {s['max_seconds']:9.3f} "
+              f"{s['items']:10d} {s['rss_delta_bytes'] / 2**20:12.1f}", file=sys.stderr)
+
+
+if ENABLED:
+    atexit.register(_report)
@@ -0,0 +1,88 @@
+# By Alexandros Panagiotakopoulos
+# Copyright (c) 2025 Alexandros Panagiotakopoulos. All rights reserved.
+# Date: 20/06/2025
+
+"""
+Quantized CPU inference for the RAG models.
+
+``torch.quantization.quantize_dynamic`` replaces every ``nn.Linear`` layer with an int8
+version whose weights are stored quantized and whose activations are quantized on the
+fly. For transformer models on CPU this is typically 2-4x faster and 4x smaller in
+memory, with a small accuracy cost. ``quantize_retriever`` and ``quantize_prompt_node``
+apply it in place to the haystack components built by ``build_haystack_pipeline()``.
+
+Run this file directly to compare fp32 and int8 latency/throughput on CPU.
+"""
+
+import time
+import statistics
+
+import torch
+
+
+def quantize_module(model):
+    """Return an int8 dynamically quantized copy of ``model`` (Linear layers only)."""
+    model.eval()
+    return torch.quantization.quantize_dynamic(model.cpu(), {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def quantize_retriever(retriever):
+    """Quantize the sentence-transformers model inside a haystack ``EmbeddingRetriever``."""
+    encoder = retriever.embedding_encoder
+    encoder.embedding_model = quantize_module(encoder.embedding_model)
+    return retriever
+
+
+def quantize_prompt_node(prompt_node):
+    """Quantize the local Hugging Face model behind a haystack ``PromptNode``."""
+    hf_pipe = prompt_node.prompt_model.model_invocation_layer.pipe
+    hf_pipe.model = quantize_module(hf_pipe.model)
+    return prompt_node
+
+
+def _timed(fn, repeats):
+    fn() # Warm-up (lazy allocations, kernel selection)
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def benchmark(embedding_model, generator_model, sentences, prompts, repeats=5):
+    """
+    Compare fp32 and int8 models on CPU.
+
+    Returns:
+        list: One dict per (model, precision) with median latency per item in ms and throughput
+        (sentences/s for the embedder, prompts/s for the generator).
+    """
+    from sentence_transformers import SentenceTransformer
+    from transformers import pipeline as hf_pipeline
+
+    rows = []
+    embedder = SentenceTransformer(embedding_model, device="cpu")
+    generator = hf_pipeline("text2text-generation", model=generator_model, device=-1)
+    for precision in ("fp32", "int8"):
+        if precision == "int8":
+            embedder = quantize_module(embedder)
+            generator.model = quantize_module(generator.model)
+        times = _timed(lambda: embedder.encode(sentences, batch_size=32), repeats)
+        median = statistics.median(times)
+        rows.append({"model": embedding_model, "precision": precision,
+                     "latency_ms": median * 1000 / len(sentences), "throughput": len(sentences) / median})
+        times = _timed(lambda: [generator(p, max_length=100) for p in prompts], repeats)
+        median = statistics.median(times)
+        rows.append({"model": generator_model, "precision": precision,
+                     "latency_ms": median * 1000 / len(prompts), "throughput": len(prompts) / median})
+    return rows
+
+
+if __name__ == "__main__":
+    sentences = ["Leukemia is a cancer of the blood-forming tissues, including the bone marrow."] * 64
+    prompts = ["Given the context, answer the question.\nContext: Chronic lymphocytic leukemia (CLL) is a type of "
+               "cancer of the blood and bone marrow.\nQuestion: What is CLL?\nAnswer:"] * 4
+    for row in benchmark("sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2", "google/flan-t5-large",
+                         sentences, prompts, repeats=3):
+        print(f"{row['model']:62s} {row['precision']}  {row['latency_ms']:9.1f} ms/item  {row['throughput']:8.1f} items/s")
@@ -0,0 +1,169 @@
+# By Alexandros Panagiotakopoulos
+# Copyright (c) 2025 Alexandros Panagiotakopoulos. All rights reserved.
+# Date: 20/06/2025
+
+"""
+Two-level cache in front of the RAG pipeline for frequently repeated questions.
+
+Level 1 maps the normalized query text to its query embedding, so "What is leukemia?"
+and "  what is LEUKEMIA " are embedded once. Level 2 maps (embedding bucket, top_k,
+corpus version) to the generated answer, where the bucket is the rounded, normalized
+embedding: near-identical embeddings land in the same bucket and skip retrieval and
+flan-t5 generation entirely. Both levels use LRU eviction with a time-to-live, and
+both are cleared when the corpus version (the embedding index digest) changes.
+"""
+
+import re
+import time
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+from batch_query import retrieve_batch, format_prompt, generate_batch
+from profiling import stage
+
+
+class LRUTTLCache:
+    """Thread-safe LRU cache whose entries also expire ``ttl`` seconds after insertion."""
+
+    def __init__(self, maxsize=10000, ttl=3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.data = OrderedDict() # key -> (inserted_at, value), least recently used first
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self.lock:
+            item = self.data.get(key)
+            if item is None or (self.ttl and time.monotonic() - item[0] > self.ttl):
+                if item is not None:
+                    del self.data[key] # Expired
+                self.misses += 1
+                return default
+            self.data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key, value):
+        with self.lock:
+            self.data[key] = (time.monotonic(), value)
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+    def __len__(self):
+        return len(self.data)
+
+
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_query(query):
+    """Unicode NFC, case folding, collapsed whitespace, no trailing '?' / Greek ';'."""
+    query = unicodedata.normalize("NFC", query).casefold()
+    return _SPACES.sub(" ", query).strip().rstrip("?;\u037e.!").strip() # ';' and U+037E are both used as the Greek question mark
+
+
+class CachedRAG:
+    """Answers questions through a two-level cache backed by the pipeline's Retriever and PromptNode."""
+
+    def __init__(self, pipe, corpus_version="", embedding_cache_size=50000, answer_cache_size=20000,
+                 ttl=24 * 3600, bucket_decimals=2, batch_size=8):
+        """
+        Args:
+            pipe: The pipeline returned by ``build_haystack_pipeline()``.
+            corpus_version (str): Digest of the indexed corpus (``pipe.corpus_version``).
+            embedding_cache_size (int): Level-1 capacity (normalized query -> embedding).
+            answer_cache_size (int): Level-2 capacity (embedding bucket -> answer).
+            ttl (float): Seconds an entry stays valid in either level.
+            bucket_decimals (int): Rounding of the normalized embedding for the bucket key;
+                fewer decimals merge more paraphrases into one bucket.
+            batch_size (int): Prompts per generation batch for cache misses.
+        """
+        self.retriever = pipe.get_node("Retriever")
+        self.prompt_node = pipe.get_node("PromptNode")
+        self.corpus_version = corpus_version
+        self.embeddings = LRUTTLCache(embedding_cache_size, ttl)
+        self.answers = LRUTTLCache(answer_cache_size, ttl)
+        self.scale = 10 ** bucket_decimals
+        self.batch_size = batch_size
+
+    def set_corpus_version(self, version):
+        """Invalidate both levels when the corpus index changes."""
+        if version != self.corpus_version:
+            self.embeddings.clear()
+            self.answers.clear()
+            self.corpus_version = version
+
+    def embed(self, queries):
+        """
+        Level 1: embeddings of ``queries``, computing only the uncached ones (in one batch).
+
+        The normalized text is only the key; the model embeds the first original query
+        seen for it, since the cased tokenizer would mangle "CLL" folded to "cll".
+        """
+        keys = [normalize_query(q) for q in queries]
+        originals = {}
+        for k, q in zip(keys, queries):
+            originals.setdefault(k, q)
+        found = {k: self.embeddings.get(k) for k in originals}
+        missing = [k for k, v in found.items() if v is None]
+        if missing:
+            for k, emb in zip(missing, self.retriever.embed_queries([originals[k] for k in missing])):
+                emb = np.asarray(emb, dtype=np.float32)
+                self.embeddings.put(k, emb)
+                found[k] = emb
+        return np.stack([found[k] for k in keys])
+
+    def bucket(self, embedding):
+        unit = embedding / (np.linalg.norm(embedding) + 1e-12)
+        return hashlib.sha1(np.round(unit * self.scale).astype(np.int16).tobytes()).hexdigest()
+
+    def ask_batch(self, queries, top_k=5):
+        """
+        Answer ``queries``; cached answers are returned as-is, the rest are generated in batches.
+
+        Returns:
+            list: One ``{"query", "documents", "answer", "cached"}`` dict per question.
+        """
+        q_emb = self.embed(queries)
+        keys = [(self.bucket(e), top_k, self.corpus_version) for e in q_emb]
+        results = [None] * len(queries)
+        todo = {} # Level-2 key -> positions that share it
+        for i, key in enumerate(keys):
+            hit = self.answers.get(key)
+            if hit is not None:
+                results[i] = dict(hit, query=queries[i], cached=True)
+            else:
+                todo.setdefault(key, []).append(i)
+        if todo:
+            first = [positions[0] for positions in todo.values()] # One generation per distinct bucket
+            with stage("retrieval", items=len(first)):
+                retrieved = retrieve_batch(self.retriever, [queries[i] for i in first], top_k, q_emb=q_emb[first])
+            prompts = [format_prompt(queries[i], docs) for i, docs in zip(first, retrieved)]
+            with stage("generation", items=len(prompts)):
+                answers = generate_batch(self.prompt_node, prompts, self.batch_size)
+            for (key, positions), docs, answer in zip(todo.items(), retrieved, answers):
+                entry = {"documents": docs, "answer": answer}
+                self.answers.put(key, entry)
+                for i in positions:
+                    results[i] = dict(entry, query=queries[i], cached=False)
+        return results
+
+    def ask(self, query, top_k=5):
+        """Answer a single question (see ``ask_batch``)."""
+        return self.ask_batch([query], top_k)[0]
+
+    def stats(self):
+        return {"embedding_hits": self.embeddings.hits, "embedding_misses": self.embeddings.misses,
+                "answer_hits": self.answers.hits, "answer_misses": self.answers.misses,
+                "corpus_version": self.corpus_version}
@@ -0,0 +1,240 @@
+# By Alexandros Panagiotakopoulos
+# Copyright (c) 2025 Alexandros Panagiotakopoulos. All rights reserved.
+# Date: 20/06/2025
+
+"""
+Retrieval quality and latency benchmark for the Biomedical RAG pipeline.
+
+For every configuration in a grid (top_k, chunk size, vector index, retrieval mode,
+serving mode) the pipeline is built in a fresh process, so the reported peak RSS belongs
+to that configuration alone. Each run measures:
+
+    recall@k      share of a question's gold documents among the top_k retrieved
+    MRR           1 / rank of the first gold document (0 when none is retrieved)
+    latency       p50/p90/p99 of single-question answer latency (retrieval + generation)
+    throughput    questions/s when all questions are answered with ``run_batch``
+    peak RSS      resident set size high-water mark of the worker process
+
+Gold documents are matched on ``meta["filename"]`` (and ``meta["merged_sources"]`` of
+deduplicated documents), so every chunk of a gold file counts. ``ivf`` configurations
+use ``--ann-min-docs`` (default 0), so the IVF index is searched even on a small corpus;
+the ``search`` column reports whether a configuration actually ran "ivf" or "exact".
+The question file is JSON: ``[{"question": "...", "gold": ["leukemia.txt", ...]}, ...]``.
+
+``--synthetic`` generates a tiny hematology corpus with its own questions, so the
+benchmark runs offline with small models (e.g. all-MiniLM-L6-v2 and flan-t5-small from
+the local Hugging Face cache):
+
+    python rag_benchmark.py --synthetic --embedding-model sentence-transformers/all-MiniLM-L6-v2 \\
+        --generator-model google/flan-t5-small --serving cpu cpu-int8 --top-k 1 3 5 --output bench.json
+"""
+
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import itertools
+import statistics
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource # Not available on Windows
+except ImportError:
+    resource = None
+
+
+SYNTHETIC_TOPICS = {
+    "leukemia": ("Leukemia", "a cancer of the blood-forming tissues, including the bone marrow",
+                 "fatigue, frequent infections and easy bruising", "chemotherapy and stem cell transplant"),
+    "cll": ("Chronic lymphocytic leukemia (CLL)", "a slowly progressing cancer of B lymphocytes",
+            "swollen lymph nodes and night sweats", "watchful waiting and targeted BTK inhibitors"),
+    "aml": ("Acute myeloid leukemia", "a fast-growing cancer of myeloid precursor cells",
+            "anemia, bleeding and fever", "intensive induction chemotherapy"),
+    "dlbcl": ("Diffuse large B-cell lymphoma (DLBCL)", "the most common aggressive non-Hodgkin lymphoma",
+              "a rapidly enlarging mass and weight loss", "R-CHOP immunochemotherapy"),
+    "hodgkin": ("Hodgkin lymphoma", "a lymphoma marked by Reed-Sternberg cells",
+                "painless neck lymph nodes and itching", "ABVD chemotherapy and radiotherapy"),
+    "myeloma": ("Multiple myeloma", "a cancer of plasma cells in the bone marrow",
+                "bone pain, kidney damage and high calcium", "proteasome inhibitors and autologous transplant"),
+    "mds": ("Myelodysplastic syndrome", "a group of disorders with ineffective blood cell production",
+            "low blood counts and transfusion needs", "hypomethylating agents"),
+    "cart": ("CAR-T cell therapy", "a treatment that reprograms a patient's T cells to attack cancer",
+             "cytokine release syndrome as a side effect", "a single infusion after lymphodepletion"),
+    "mgus": ("Monoclonal gammopathy of undetermined significance", "a premalignant plasma cell disorder",
+             "usually no symptoms", "regular monitoring"),
+    "waldenstrom": ("Waldenström macroglobulinemia", "a lymphoma that produces IgM protein",
+                    "blood hyperviscosity and neuropathy", "rituximab-based therapy"),
+}
+
+
+def make_synthetic_corpus(filler_docs=40, seed=0):
+    """
+    Build a small offline corpus and its questions.
+
+    Returns:
+        tuple: (documents as ``{"content", "meta"}`` dicts, ``[{"question", "gold"}]``).
+    """
+    rng = random.Random(seed)
+    docs, questions = [], []
+    for key, (name, definition, symptoms, treatment) in SYNTHETIC_TOPICS.items():
+        filename = f"{key}.txt"
+        content = (f"{name} is {definition}. Typical symptoms include {symptoms}. "
+                   f"It is usually managed with {treatment}. ") * 2
+        docs.append({"content": content, "meta": {"filename": filename, "lang": "en"}})
+        questions += [
+            {"question": f"What is {name}?", "gold": [filename]},
+            {"question": f"Which symptoms does {name.split(' (')[0].lower()} cause?", "gold": [filename]},
+            {"question": f"How is {name.split(' (')[0].lower()} treated?", "gold": [filename]},
+        ]
+    words = "blood cell marrow patient clinical study dose trial protein gene immune therapy risk".split()
+    for i in range(filler_docs): # Distractors that share the vocabulary
+        content = " ".join(rng.choice(words) for _ in range(60)) + "."
+        docs.append({"content": content, "meta": {"filename": f"filler_{i}.txt", "lang": "en"}})
+    return docs, questions
+
+
+def load_questions(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def retrieval_metrics(retrieved, questions):
+    """Mean recall@k and MRR of ``retrieved`` (list of document lists) against the gold filenames."""
+    recalls, reciprocal_ranks = [], []
+    for docs, item in zip(retrieved, questions):
+        gold = set(item["gold"])
+        names = [{d.meta.get("filename"), *d.meta.get("merged_sources", [])} for d in docs] # A merged copy counts as its sources
+        recalls.append(len(gold & set().union(*names)) / len(gold) if gold else 0.0)
+        rank = next((i for i, found in enumerate(names, 1) if found & gold), None)
+        reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+    return {"recall_at_k": statistics.mean(recalls), "mrr": statistics.mean(reciprocal_ranks)}
+
+
+def percentiles(values):
+    values = sorted(values)
+    return {f"p{p}_ms": values[min(len(values) - 1, int(p / 100 * len(values)))] * 1000 for p in (50, 90, 99)}
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024 # bytes on macOS, KiB on Linux
+
+
+def run_config(config, top_ks, questions, docs=None, batch_size=8, latency_samples=20):
+    """
+    Build one pipeline and evaluate it at every ``top_k``. Meant to run in its own process.
+
+    Returns:
+        list: One result dict per ``top_k``.
+    """
+    from RAG import build_haystack_pipeline
+    from batch_query import run_batch, retrieve_batch
+
+    with tempfile.TemporaryDirectory() as index_folder: # Fresh embedding index, so build time includes embedding
+        start = time.perf_counter()
+        pipe = build_haystack_pipeline(docs=docs, index_folder=index_folder, **config)
+        retriever = pipe.get_node("Retriever")
+        uses_index = getattr(retriever.document_store, "uses_index", None) # ann_store.ANNDocumentStore; also builds the IVF index
+        search = "ivf" if uses_index and uses_index() else "exact"
+        build_s = time.perf_counter() - start
+        texts = [item["question"] for item in questions]
+        rows = []
+        for top_k in top_ks:
+            start = time.perf_counter()
+            retrieved = retrieve_batch(retriever, texts, top_k)
+            retrieval_s = time.perf_counter() - start
+            latencies = []
+            for text in texts[:latency_samples]: # One question at a time, as an interactive user would ask
+                start = time.perf_counter()
+                run_batch(pipe, [text], top_k=top_k)
+                latencies.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            run_batch(pipe, texts, top_k=top_k, batch_size=batch_size)
+            batch_s = time.perf_counter() - start
+            rows.append(dict(config, search=search, top_k=top_k, questions=len(texts), build_s=build_s,
+                             documents=retriever.document_store.get_document_count(),
+                             retrieval_qps=len(texts) / retrieval_s, throughput_qps=len(texts) / batch_s,
+                             **retrieval_metrics(retrieved, questions), **percentiles(latencies)))
+        peak = peak_rss_mb()
+        for row in rows:
+            row["peak_rss_mb"] = peak
+        return rows
+
+
+def config_grid(chunk_tokens, vector_indexes, retrieval_modes, serving_modes, embedding_model, generator_model,
+                vector_stores=("memory",), ann_params=None, routing=True):
+    """Every supported combination of the build-time settings (top_k is swept inside each build)."""
+    for chunk, index, retrieval, serving, store in itertools.product(chunk_tokens, vector_indexes, retrieval_modes,
+                                                                     serving_modes, vector_stores):
+        if store == "compact" and (index != "exact" or retrieval != "dense"):
+            continue # The compact store serves exact dense retrieval only
+        if index == "ivf" and retrieval != "dense":
+            continue # Hybrid and prefilter score against the exact matrix
+        config = {"chunk_max_tokens": chunk, "vector_index": index, "retrieval_mode": retrieval, "serving_mode": serving,
+                  "vector_store": store, "embedding_model": embedding_model, "generator_model": generator_model,
+                  "language_routing": routing and index == "exact" and store == "memory"} # Reported per row; IVF and compact are not partitioned
+        if index == "ivf" and ann_params:
+            config["ann_params"] = ann_params
+        yield config
+
+
+def run_benchmark(configs, top_ks, questions, docs=None, batch_size=8, latency_samples=20):
+    """Run every configuration in a fresh spawned process and collect the result rows."""
+    results = []
+    context = multiprocessing.get_context("spawn") # Separate processes keep peak RSS and model memory per configuration
+    for config in configs:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            rows = pool.submit(run_config, config, top_ks, questions, docs, batch_size, latency_samples).result()
+        for row in rows:
+            print(f"[Benchmark] {row['retrieval_mode']:9s} {row['vector_index']:5s}->{row['search']:5s} {row['vector_store']:7s} "
+                  f"{'routed' if row['language_routing'] else 'all':6s} chunk={row['chunk_max_tokens']:<4d} "
+                  f"{row['serving_mode']:8s} k={row['top_k']:<3d} recall={row['recall_at_k']:.3f} mrr={row['mrr']:.3f} "
+                  f"p50={row['p50_ms']:.0f}ms qps={row['throughput_qps']:.1f} rss={row['peak_rss_mb']}MB")
+        results += rows
+    return results
+
+
+if __name__ == "__main__":
+    from RAG import EMBEDDING_MODEL, GENERATOR_MODEL, CHUNK_MAX_TOKENS, ANN_PARAMS
+
+    parser = argparse.ArgumentParser(description="Benchmark retrieval quality and latency of the RAG pipeline.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--questions", help="JSON file of {question, gold} items (evaluated on the configured corpus)")
+    source.add_argument("--synthetic", action="store_true", help="use the built-in synthetic corpus and questions")
+    parser.add_argument("--top-k", type=int, nargs="+", default=[1, 3, 5])
+    parser.add_argument("--chunk-tokens", type=int, nargs="+", default=[CHUNK_MAX_TOKENS])
+    parser.add_argument("--index", nargs="+", default=["exact"], choices=["exact", "ivf"])
+    parser.add_argument("--no-routing", action="store_true", help="search all languages (LANGUAGE_ROUTING = False)")
+    parser.add_argument("--ann-min-docs", type=int, default=0, help="ANN_PARAMS['min_docs'] for ivf runs (below it search is exact)")
+    parser.add_argument("--retrieval", nargs="+", default=["dense", "hybrid"], choices=["dense", "hybrid", "prefilter"])
+    parser.add_argument("--serving", nargs="+", default=["cpu"], choices=["gpu", "cpu", "cpu-int8"])
+    parser.add_argument("--store", nargs="+", default=["memory"], choices=["memory", "compact"])
+    parser.add_argument("--embedding-model", default=EMBEDDING_MODEL)
+    parser.add_argument("--generator-model", default=GENERATOR_MODEL)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--latency-samples", type=int, default=20, help="questions timed one at a time")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        docs, questions = make_synthetic_corpus()
+    else:
+        docs, questions = None, load_questions(args.questions) # None = load_biomedical_documents()
+    configs = config_grid(args.chunk_tokens, args.index, args.retrieval, args.serving,
+                          args.embedding_model, args.generator_model, args.store, dict(ANN_PARAMS, min_docs=args.ann_min_docs),
+                          not args.no_routing)
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "corpus": "synthetic" if args.synthetic else args.questions,
+        "results": run_benchmark(configs, args.top_k, questions, docs, args.batch_size, args.latency_samples),
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    else:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
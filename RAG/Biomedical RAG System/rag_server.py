@@ -0,0 +1,277 @@
+# By Alexandros Panagiotakopoulos
+# Copyright (c) 2025 Alexandros Panagiotakopoulos. All rights reserved.
+# Date: 20/06/2025
+
+"""
+Long-running HTTP/JSON query server for the Biomedical RAG pipeline.
+
+The pipeline from ``build_haystack_pipeline()`` is built once and kept resident, so the
+corpus, the embeddings and both models stay warm between requests. Requests are handled
+with asyncio; concurrent queries are collected for up to ``max_wait_ms`` (or until
+``max_batch`` are waiting) and answered together with one ``run_batch`` call, i.e. one
+retriever pass and batched generation. Repeated questions are answered from a
+``query_cache.CachedRAG`` in front of the batcher unless ``--no-cache`` is given.
+
+Endpoints:
+    POST /query    {"query": "...", "top_k": 5}  ->  {"answer", "documents", "latency_ms"}
+    GET  /health   liveness and readiness
+    GET  /metrics  Prometheus text format
+
+Usage:
+    python rag_server.py serve --port 8000
+    python rag_server.py bench --url http://127.0.0.1:8000 --concurrency 16 --requests 500
+"""
+
+import json
+import time
+import asyncio
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import profiling
+
+
+class MicroBatcher:
+    """Collects concurrent queries and answers them with one ``run_batch`` call per batch."""
+
+    def __init__(self, answer_fn, max_batch=16, max_wait_ms=10):
+        """
+        Args:
+            answer_fn (callable): ``answer_fn(queries, top_k)`` -> list of result dicts
+                (``CachedRAG.ask_batch``, or ``batch_query.run_batch`` bound to a pipeline).
+            max_batch (int): Largest batch sent to the models.
+            max_wait_ms (float): How long the first query of a batch waits for company.
+        """
+        self.answer_fn = answer_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.queue = None
+        self.executor = ThreadPoolExecutor(max_workers=1) # The models run on one thread; batching gives the parallelism
+        self.metrics = {"requests_total": 0, "errors_total": 0, "batches_total": 0,
+                        "batched_queries_total": 0, "latency_seconds_sum": 0.0}
+
+    async def start(self):
+        self.queue = asyncio.Queue()
+        self.task = asyncio.create_task(self._run())
+
+    async def submit(self, query, top_k):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((query, top_k, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            by_top_k = {} # Queries with different top_k are answered in separate calls
+            for item in batch:
+                by_top_k.setdefault(item[1], []).append(item)
+            for top_k, items in by_top_k.items():
+                queries = [q for q, _, _ in items]
+                try:
+                    results = await loop.run_in_executor(self.executor, self.answer_fn, queries, top_k)
+                except Exception as e: # Fail this batch, keep serving
+                    self.metrics["errors_total"] += len(items)
+                    for _, _, future in items:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                self.metrics["batches_total"] += 1
+                self.metrics["batched_queries_total"] += len(items)
+                for (_, _, future), result in zip(items, results):
+                    if not future.done():
+                        future.set_result(result)
+
+
+class RAGServer:
+    """Minimal asyncio HTTP/1.1 server (keep-alive, JSON bodies) around a ``MicroBatcher``."""
+
+    def __init__(self, batcher, host="127.0.0.1", port=8000, cache=None):
+        self.batcher = batcher
+        self.cache = cache # query_cache.CachedRAG behind the batcher, for the /metrics hit counts
+        self.host = host
+        self.port = port
+        self.started = time.time()
+
+    async def serve(self):
+        await self.batcher.start()
+        server = await asyncio.start_server(self._handle, self.host, self.port)
+        print(f"RAG server listening on http://{self.host}:{self.port}")
+        async with server:
+            await server.serve_forever()
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, version = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0) or 0))
+                status, payload, content_type = await self._route(method, path.split("?")[0], body)
+                keep_alive = headers.get("connection", "").lower() != "close" and version.strip() == "HTTP/1.1"
+                writer.write((f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                              f"Content-Length: {len(payload)}\r\n"
+                              f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode("latin-1") + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, method, path, body):
+        if method == "GET" and path == "/health":
+            return "200 OK", json.dumps({"status": "ok", "uptime_s": time.time() - self.started}).encode(), "application/json"
+        if method == "GET" and path == "/metrics":
+            return "200 OK", self.metrics_text().encode(), "text/plain; version=0.0.4"
+        if method == "POST" and path == "/query":
+            return await self._query(body)
+        return "404 Not Found", b'{"error": "not found"}', "application/json"
+
+    async def _query(self, body):
+        start = time.perf_counter()
+        metrics = self.batcher.metrics
+        metrics["requests_total"] += 1
+        try:
+            request = json.loads(body or b"{}")
+            query = request["query"]
+            top_k = int(request.get("top_k", 5))
+        except (ValueError, KeyError, TypeError):
+            metrics["errors_total"] += 1
+            return "400 Bad Request", b'{"error": "expected {\\"query\\": ..., \\"top_k\\": ...}"}', "application/json"
+        try:
+            result = await self.batcher.submit(query, top_k)
+        except Exception as e:
+            return "500 Internal Server Error", json.dumps({"error": str(e)}).encode(), "application/json"
+        latency = time.perf_counter() - start
+        metrics["latency_seconds_sum"] += latency
+        response = {
+            "query": query,
+            "answer": result["answer"],
+            "documents": [{"filename": d.meta.get("filename"), "score": d.score} for d in result["documents"]],
+            "latency_ms": latency * 1000,
+        }
+        return "200 OK", json.dumps(response, ensure_ascii=False).encode("utf-8"), "application/json; charset=utf-8"
+
+    def metrics_text(self):
+        m = self.batcher.metrics
+        lines = []
+        for name, value in m.items():
+            kind = "counter" if name.endswith("_total") or name.endswith("_sum") else "gauge"
+            lines += [f"# TYPE rag_{name} {kind}", f"rag_{name} {value}"]
+        if self.cache is not None:
+            for name, value in self.cache.stats().items():
+                if name.endswith(("_hits", "_misses")):
+                    lines += [f"# TYPE rag_cache_{name}_total counter", f"rag_cache_{name}_total {value}"]
+        lines += ["# TYPE rag_queue_depth gauge", f"rag_queue_depth {self.batcher.queue.qsize() if self.batcher.queue else 0}"]
+        text = "\n".join(lines) + "\n"
+        if profiling.ENABLED: # Per-stage timings (retrieval, generation, ...) when RAG_PROFILE is set
+            text += profiling.prometheus_text()
+        return text
+
+
+def run_benchmark(url, queries, concurrency=16, total=200, top_k=5):
+    """
+    Fire ``total`` queries from ``concurrency`` client threads and report latency percentiles.
+
+    Returns:
+        dict: p50/p90/p99 latency in ms, throughput in queries/s and the error count.
+    """
+    import http.client
+    from urllib.parse import urlparse
+
+    target = urlparse(url)
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    counter = iter(range(total))
+
+    def client():
+        conn = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=300) # Keep-alive per client
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                break
+            body = json.dumps({"query": queries[i % len(queries)], "top_k": top_k})
+            start = time.perf_counter()
+            try:
+                conn.request("POST", "/query", body, {"Content-Type": "application/json"})
+                response = conn.getresponse()
+                response.read()
+                ok = response.status == 200
+            except (OSError, http.client.HTTPException):
+                ok = False
+                conn.close()
+                conn = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=300)
+            elapsed = time.perf_counter() - start
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors[0] += 1
+        conn.close()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+    latencies.sort()
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000 if latencies else None
+
+    return {"requests": total, "errors": errors[0], "p50_ms": pct(50), "p90_ms": pct(90), "p99_ms": pct(99),
+            "throughput_qps": len(latencies) / wall}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Biomedical RAG query server.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve = sub.add_parser("serve", help="build the pipeline and serve queries")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8000)
+    serve.add_argument("--max-batch", type=int, default=16)
+    serve.add_argument("--max-wait-ms", type=float, default=10)
+    serve.add_argument("--no-cache", action="store_true", help="answer every query with the models")
+    bench = sub.add_parser("bench", help="load-test a running server")
+    bench.add_argument("--url", default="http://127.0.0.1:8000")
+    bench.add_argument("--concurrency", type=int, default=16)
+    bench.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        from RAG import build_haystack_pipeline
+        from batch_query import run_batch
+        from query_cache import CachedRAG
+        pipe = build_haystack_pipeline() # Built once; corpus, embeddings and models stay resident
+        cache = None if args.no_cache else CachedRAG(pipe, corpus_version=pipe.corpus_version)
+        answer_fn = cache.ask_batch if cache else (lambda queries, top_k: run_batch(pipe, queries, top_k=top_k))
+        batcher = MicroBatcher(answer_fn, max_batch=args.max_batch, max_wait_ms=args.max_wait_ms)
+        asyncio.run(RAGServer(batcher, args.host, args.port, cache).serve())
+    else:
+        questions = ["Τι είναι η λευχαιμία;", "What is leukemia?", "Τι είναι το μυέλωμα;",
+                     "What are the symptoms of lymphoma?", "Τι είναι η CAR-T θεραπεία;", "What is bone marrow transplantation?"]
+        print(json.dumps(run_benchmark(args.url, questions, args.concurrency, args.requests), indent=2))
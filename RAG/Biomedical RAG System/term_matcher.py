@@ -0,0 +1,123 @@
+# By Alexandros Panagiotakopoulos
+# Copyright (c) 2025 Alexandros Panagiotakopoulos. All rights reserved.
+# Date: 20/06/2025
+
+"""
+Aho–Corasick multi-term matcher.
+
+The automaton is compiled once per term list and scans a document in a single pass,
+no matter how many terms there are. Matching is done on Unicode case-folded text, so
+"Λευχαιμία", "ΛΕΥΧΑΙΜΊΑ" and "λευχαιμία" are all found, and final sigma (ς) matches
+medial sigma (σ). Reported offsets always refer to the original, unfolded text.
+"""
+
+from collections import deque
+
+
+class TermMatcher:
+    """A compiled Aho–Corasick automaton over a fixed list of terms."""
+
+    def __init__(self, terms):
+        """
+        Args:
+            terms (list): The terms to search for (any case, any script).
+        """
+        self.terms = list(dict.fromkeys(terms)) # Drop duplicate terms, keep order
+        self._goto = [{}] # State -> {char: next state}
+        self._fail = [0] # State -> failure link
+        self._out = [()] # State -> indexes of the terms that end in this state
+        for idx, term in enumerate(self.terms):
+            self._add(term.casefold(), idx)
+        self._build_links()
+
+    def _add(self, pattern, idx):
+        state = 0
+        for ch in pattern:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            state = nxt
+        self._out[state] = self._out[state] + (idx,)
+
+    def _build_links(self): # Breadth-first, so a state's failure target is always finished first
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]] # Inherit matches of the suffix state
+
+    def _scan(self, folded):
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for pos, ch in enumerate(folded):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                yield pos, out[state]
+
+    def contains_any(self, text):
+        """Return True as soon as any term occurs in ``text``."""
+        for _ in self._scan(text.casefold()):
+            return True
+        return False
+
+    def find_all(self, text):
+        """
+        Find every occurrence of every term in one pass.
+
+        Args:
+            text (str): The document text.
+
+        Returns:
+            list: ``(term, start, end)`` tuples with offsets into the original ``text``,
+            in order of their end position. Overlapping matches are all reported.
+        """
+        folded = text.casefold()
+        if len(folded) == len(text): # Case folding kept every character one-to-one
+            origin = None
+        else: # A character expanded (e.g. "ß" -> "ss"); map folded positions back
+            origin = []
+            for i, ch in enumerate(text):
+                origin.extend([i] * len(ch.casefold()))
+        lengths = [len(t.casefold()) for t in self.terms]
+        matches = []
+        for pos, term_ids in self._scan(folded):
+            for idx in term_ids:
+                start = pos - lengths[idx] + 1
+                if origin is None:
+                    matches.append((self.terms[idx], start, pos + 1))
+                else:
+                    matches.append((self.terms[idx], origin[start], origin[pos] + 1))
+        return matches
+
+    def matched_terms(self, text):
+        """Return the distinct terms found in ``text``, in order of first occurrence."""
+        return list(dict.fromkeys(term for term, _, _ in self.find_all(text)))
+
+
+_matchers = {} # Tuple of terms -> compiled TermMatcher
+
+
+def get_matcher(terms):
+    """Return the cached automaton for ``terms``, compiling it on first use."""
+    key = tuple(terms)
+    matcher = _matchers.get(key)
+    if matcher is None:
+        matcher = _matchers[key] = TermMatcher(key)
+    return matcher
+
+
+def matched_terms(text, terms):
+    """Module-level helper (picklable for process pools): distinct ``terms`` found in ``text``."""
+    return get_matcher(terms).matched_terms(text)
@@ -0,0 +1,131 @@
+# By Alexandros Panagiotakopoulos
+# Copyright (c) 2025 Alexandros Panagiotakopoulos. All rights reserved.
+# Date: 20/06/2025
+
+"""
+Local batched English -> Greek translation with a persistent translation cache.
+
+Texts are split into sentences, every sentence is looked up in a content-addressed
+SQLite cache (keyed by the SHA-256 of model + sentence), and only the misses are sent
+through the Helsinki-NLP MarianMT pipeline on CPU, in batches. Identical sentences that
+appear in the MayoClinic pages, the BioASQ answers and the XML files are therefore
+translated once, and a re-run of an already translated corpus costs nothing.
+Sentences longer than ``max_sentence_tokens`` (lists and XML blocks without ``.!?``)
+are cut into token windows first, so no input reaches the model's 512-token limit
+and is truncated.
+"""
+
+import re
+import sqlite3
+import hashlib
+
+from chunking import token_windows
+
+
+SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+')
+
+
+class TranslationCache:
+    """SQLite-backed sentence translation cache keyed by content hash."""
+
+    def __init__(self, path, namespace=""):
+        """
+        Args:
+            path (str): SQLite database file (created if missing).
+            namespace (str): Mixed into every key, e.g. the model name, so that
+                translations of different models never collide.
+        """
+        self.namespace = namespace
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL") # Readers are not blocked by the writer
+        self.conn.execute("CREATE TABLE IF NOT EXISTS translations (key TEXT PRIMARY KEY, target TEXT NOT NULL)")
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, sentence):
+        return hashlib.sha256((self.namespace + "\0" + sentence).encode("utf-8")).hexdigest()
+
+    def get_many(self, sentences):
+        """Return {sentence: translation} for the sentences that are cached."""
+        keys = {self.key(s): s for s in sentences}
+        found = {}
+        key_list = list(keys)
+        for i in range(0, len(key_list), 500): # Stay below SQLite's bound-parameter limit
+            batch = key_list[i:i + 500]
+            rows = self.conn.execute(
+                f"SELECT key, target FROM translations WHERE key IN ({','.join('?' * len(batch))})", batch)
+            for k, target in rows:
+                found[keys[k]] = target
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, pairs):
+        """Store ``(sentence, translation)`` pairs."""
+        with self.conn: # One transaction per batch
+            self.conn.executemany("INSERT OR REPLACE INTO translations (key, target) VALUES (?, ?)",
+                                  [(self.key(s), t) for s, t in pairs])
+
+    def close(self):
+        self.conn.close()
+
+
+class MarianBatchTranslator:
+    """Sentence-level batched translation through a Hugging Face translation pipeline."""
+
+    def __init__(self, hf_translator, cache=None, batch_size=16, max_length=512, max_sentence_tokens=200):
+        """
+        Args:
+            hf_translator: A ``transformers`` "translation" pipeline (e.g. Helsinki-NLP/opus-mt-en-el).
+            cache (TranslationCache): Optional persistent cache.
+            batch_size (int): Number of sentences per forward pass.
+            max_length (int): Maximum generated tokens per sentence.
+            max_sentence_tokens (int): Longer sentences are split into pieces of at most
+                this many words and punctuation marks (about 1.5 Marian subwords each).
+        """
+        self.hf_translator = hf_translator
+        self.cache = cache
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.max_sentence_tokens = max_sentence_tokens
+
+    def _pieces(self, sentence):
+        """``sentence``, or its token windows when it is too long to translate in one pass."""
+        if len(sentence) <= self.max_sentence_tokens: # Fewer characters than the limit means fewer tokens too
+            return [sentence]
+        return [sentence[start:end] for start, end in token_windows(sentence, self.max_sentence_tokens, overlap_tokens=0)]
+
+    def _translate_sentences(self, sentences):
+        unique = list(dict.fromkeys(s for s in sentences if s)) # Each distinct sentence is translated once
+        done = self.cache.get_many(unique) if self.cache else {}
+        pending = [s for s in unique if s not in done]
+        pending.sort(key=len) # Similar lengths in a batch means less padding
+        for i in range(0, len(pending), self.batch_size):
+            batch = pending[i:i + self.batch_size]
+            outputs = self.hf_translator(batch, batch_size=len(batch), max_length=self.max_length, truncation=True)
+            translated = [out["translation_text"] for out in outputs]
+            done.update(zip(batch, translated))
+            if self.cache:
+                self.cache.put_many(zip(batch, translated)) # Persist as we go, so an interrupted run keeps its work
+        return done
+
+    def translate_many(self, texts):
+        """
+        Translate several texts, batching their sentences together.
+
+        Args:
+            texts (list): English texts; paragraph breaks are preserved.
+
+        Returns:
+            list: The Greek translations, in the same order.
+        """
+        layouts = [] # Per text: list of paragraphs, each a list of sentences
+        for text in texts:
+            layouts.append([[piece for s in SENTENCE_SPLIT.split(p) if s.strip() for piece in self._pieces(s.strip())]
+                            for p in text.split("\n\n")])
+        done = self._translate_sentences([s for layout in layouts for p in layout for s in p])
+        return ["\n\n".join(" ".join(done[s] for s in p) for p in layout if p) for layout in layouts]
+
+    def translate(self, text):
+        """Translate a single text."""
+        return self.translate_many([text])[0]
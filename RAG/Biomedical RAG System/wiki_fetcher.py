@@ -0,0 +1,178 @@
+# By Alexandros Panagiotakopoulos
+# Copyright (c) 2025 Alexandros Panagiotakopoulos. All rights reserved.
+# Date: 20/06/2025
+
+"""
+Bulk Wikipedia intro fetcher with an on-disk HTTP cache.
+
+Titles are sent to the MediaWiki API in batches (``titles=A|B|C``) over one pooled
+``requests.Session``, batches are fetched concurrently, and every API response is cached
+on disk. A cached response younger than ``max_age`` seconds is used without any request;
+an older one is revalidated with ``If-None-Match`` / ``If-Modified-Since`` and a
+``304 Not Modified`` reply keeps the cached body. The API URL is configurable, so the
+fetcher can be run against a local stub server.
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+API_URL = "https://el.wikipedia.org/w/api.php"
+MAX_TITLES = 20 # The TextExtracts API returns at most 20 intro extracts per request (exlimit)
+
+
+class HTTPCache:
+    """One JSON file per request, holding the body and its validators."""
+
+    def __init__(self, folder, max_age=7 * 24 * 3600):
+        self.folder = folder
+        self.max_age = max_age
+        os.makedirs(folder, exist_ok=True)
+
+    def path(self, url, params):
+        key = hashlib.sha1(json.dumps([url, sorted(params.items())], ensure_ascii=False).encode("utf-8")).hexdigest()
+        return os.path.join(self.folder, key + ".json")
+
+    def get(self, url, params):
+        path = self.path(url, params)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def put(self, url, params, entry):
+        path = self.path(url, params)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp" # Unique per thread, then renamed atomically
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def fresh(self, entry):
+        return time.time() - entry["fetched_at"] < self.max_age
+
+
+class WikiBulkFetcher:
+    """Fetches Wikipedia intro extracts for many titles at once."""
+
+    def __init__(self, cache_folder, api_url=API_URL, batch_size=MAX_TITLES, workers=4,
+                 max_age=7 * 24 * 3600, timeout=30):
+        """
+        Args:
+            cache_folder (str): Folder for the on-disk HTTP cache.
+            api_url (str): MediaWiki API endpoint (point it to a stub server in tests).
+            batch_size (int): Titles per request (at most 20 for intro extracts).
+            workers (int): Batches fetched concurrently.
+            max_age (float): Seconds a cached response is used without revalidation.
+            timeout (float): Per-request timeout in seconds.
+        """
+        self.api_url = api_url
+        self.batch_size = min(batch_size, MAX_TITLES)
+        self.workers = workers
+        self.timeout = timeout
+        self.cache = HTTPCache(cache_folder, max_age)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers) # Keep-alive connections shared by the workers
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["User-Agent"] = "BiomedicalRAG/1.0 (wikipedia intro fetcher)"
+        self.stats = {"requests": 0, "not_modified": 0, "cache_hits": 0}
+        self.lock = threading.Lock()
+
+    def _count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def _get(self, params):
+        """GET through the disk cache, revalidating stale entries."""
+        entry = self.cache.get(self.api_url, params)
+        if entry is not None and self.cache.fresh(entry):
+            self._count("cache_hits")
+            return entry["body"]
+        headers = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        response = self.session.get(self.api_url, params=params, headers=headers, timeout=self.timeout)
+        self._count("requests")
+        if response.status_code == 304 and entry is not None:
+            self._count("not_modified")
+            body = entry["body"]
+        else:
+            response.raise_for_status()
+            body = response.json()
+        self.cache.put(self.api_url, params, {
+            "fetched_at": time.time(),
+            "etag": response.headers.get("ETag", entry.get("etag") if entry else None),
+            "last_modified": response.headers.get("Last-Modified", entry.get("last_modified") if entry else None),
+            "body": body,
+        })
+        return body
+
+    def _fetch_batch(self, titles):
+        """Return {requested title: intro or None} for up to ``batch_size`` titles."""
+        params = {"action": "query", "prop": "extracts", "exintro": 1, "explaintext": 1,
+                  "exlimit": "max", "titles": "|".join(titles), "format": "json", "redirects": 1}
+        extracts = {}
+        aliases = {t: t for t in titles} # Requested title -> final page title
+        while True:
+            data = self._get(params)
+            query = data.get("query", {})
+            for kind in ("normalized", "redirects"): # Follow "Λέμφωμα_Hodgkin" -> "Λέμφωμα Hodgkin" -> redirect target
+                mapping = {item["from"]: item["to"] for item in query.get(kind, [])}
+                aliases = {t: mapping.get(a, a) for t, a in aliases.items()}
+            for page in query.get("pages", {}).values():
+                if page.get("extract"):
+                    extracts[page["title"]] = page["extract"]
+            if "continue" not in data:
+                break
+            params = dict(params, **data["continue"]) # Remaining extracts of the same batch
+        return {t: extracts.get(alias) for t, alias in aliases.items()}
+
+    def fetch(self, titles):
+        """
+        Fetch the intros of ``titles``.
+
+        Returns:
+            dict: {title: intro text or None}, in the order of ``titles``.
+        """
+        titles = list(dict.fromkeys(titles))
+        batches = [titles[i:i + self.batch_size] for i in range(0, len(titles), self.batch_size)]
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for batch_result in pool.map(self._fetch_batch, batches):
+                results.update(batch_result)
+        return {t: results.get(t) for t in titles}
+
+    def fetch_and_save(self, titles, output_folder):
+        """
+        Fetch the intros of ``titles`` and write each one to ``<output_folder>/<title>.txt``.
+
+        Returns:
+            tuple: (saved paths, titles without an intro).
+        """
+        os.makedirs(output_folder, exist_ok=True)
+        intros = self.fetch(titles)
+
+        def save(item):
+            title, intro = item
+            path = os.path.join(output_folder, f"{title}.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(intro)
+            return path
+
+        found = [(t, i) for t, i in intros.items() if i]
+        with ThreadPoolExecutor(max_workers=self.workers) as pool: # File writes overlap as well
+            saved = list(pool.map(save, found))
+        return saved, [t for t, i in intros.items() if not i]
+
+    def close(self):
+        self.session.close()
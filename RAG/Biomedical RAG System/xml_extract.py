@@ -0,0 +1,115 @@
+# By Alexandros Panagiotakopoulos
+# Copyright (c) 2025 Alexandros Panagiotakopoulos. All rights reserved.
+# Date: 20/06/2025
+
+"""
+Streaming text extraction from XML documents.
+
+``iter_blocks`` walks the file with ``ElementTree.iterparse`` and yields the text of each
+block element (paragraph, title, list item, ...) as soon as it is complete, without tags,
+attributes or markup whitespace. Finished elements are cleared and detached from their
+parent, so memory stays bounded by the current block however large the file is.
+Inline elements (``<b>``, ``<a>``, ``<span>``, ...) do not split a block, and the
+contents of ``<script>``/``<style>``-like elements are skipped.
+
+``extract`` joins the blocks of one file into plain text (paragraphs separated by blank
+lines, which the chunker uses as boundaries) and collects selected fields, such as the
+title, into a metadata dict. Malformed files fall back to a regex tag strip.
+"""
+
+import re
+import html
+import xml.etree.ElementTree as ET
+
+
+INLINE_TAGS = frozenset({"a", "abbr", "b", "big", "br", "code", "em", "emph", "font", "hi", "i", "small",
+                         "span", "strong", "sub", "sup", "term", "u"})
+SKIP_TAGS = frozenset({"script", "style", "noscript"})
+_TAG = re.compile(r"<[^>]+>")
+
+
+def _local(tag):
+    return tag.rsplit("}", 1)[-1].lower() if isinstance(tag, str) else "" # "{namespace}p" -> "p"; comments have no str tag
+
+
+def iter_blocks(source, skip_tags=SKIP_TAGS, inline_tags=INLINE_TAGS):
+    """
+    Yield ``(tag, text)`` for every block of text in document order.
+
+    Args:
+        source: File path or binary file object.
+        skip_tags (set): Elements whose text is dropped (local names, lower case).
+        inline_tags (set): Elements that do not start a new block.
+
+    Yields:
+        tuple: (local name of the enclosing block element, whitespace-normalized text).
+    """
+    stack = [] # [element, local tag, last finished child] per open element
+    buffer = [] # Text pieces of the current block
+    skipping = 0 # Depth inside skipped elements
+
+    def flush(tag):
+        text = " ".join("".join(buffer).split())
+        buffer.clear()
+        return (tag, text) if text else None
+
+    for event, elem in ET.iterparse(source, events=("start", "end")):
+        tag = _local(elem.tag)
+        if event == "start":
+            if stack: # Text between the parent's start (or the previous sibling's end) and this element
+                parent = stack[-1]
+                text = parent[2].tail if parent[2] is not None else parent[0].text
+                if text and not skipping:
+                    buffer.append(text)
+                if tag not in inline_tags:
+                    block = flush(parent[1])
+                    if block:
+                        yield block
+            if tag in skip_tags:
+                skipping += 1
+            stack.append([elem, tag, None])
+        else:
+            entry = stack.pop()
+            text = entry[2].tail if entry[2] is not None else elem.text # Text before this element's end tag
+            if text and not skipping:
+                buffer.append(text)
+            if tag in skip_tags:
+                skipping -= 1
+            if tag == "br":
+                buffer.append(" ") # A line break still separates words
+            elif tag not in inline_tags:
+                block = flush(tag)
+                if block:
+                    yield block
+            tail = elem.tail # iterparse reports events in batches, so the tail may already be parsed
+            elem.clear() # Frees children and attributes (and resets the tail)
+            elem.tail = tail
+            if stack:
+                stack[-1][0].remove(elem) # Detach, so the parent never accumulates finished children
+                stack[-1][2] = elem
+
+
+def extract(source, fields=("title",), skip_tags=SKIP_TAGS):
+    """
+    Plain text of an XML file plus selected fields.
+
+    Args:
+        source (str): Path to the XML file.
+        fields (tuple): Element local names whose text is also returned separately.
+        skip_tags (set): Elements whose text is dropped.
+
+    Returns:
+        tuple: (text with blank lines between blocks, {field: text}).
+    """
+    blocks, meta = [], {}
+    try:
+        for tag, text in iter_blocks(source, skip_tags):
+            blocks.append(text)
+            if tag in fields:
+                meta[tag] = f"{meta[tag]} {text}" if tag in meta else text
+    except ET.ParseError: # Not well-formed: strip the tags from the raw markup instead
+        with open(source, "r", encoding="utf-8", errors="replace") as f:
+            raw = f.read()
+        text = html.unescape(_TAG.sub(" ", raw))
+        return "\n\n".join(" ".join(line.split()) for line in text.split("\n") if line.strip()), {}
+    return "\n\n".join(blocks), meta